@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def eager_background_tasks(settings):
+    # Миниатюры генерируются в фоне и пишутся в MEDIA_ROOT. Во временном
+    # каталоге теста они должны появиться до того, как его удалят.
+    settings.BACKGROUND_TASKS_EAGER = True
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_caches(tmp_path_factory):
+    # Тесты пишут в свой кэш во временном каталоге, а не в рабочий.
+    from django.test.utils import override_settings
+
+    from core.test_runner import isolated_caches
+    cache_settings = override_settings(
+        CACHES=isolated_caches(str(tmp_path_factory.mktemp('cache')))
+    )
+    cache_settings.enable()
+    yield
+    cache_settings.disable()
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(isolated_caches):
+    # Откат базы после теста не меняет поколение лент (on_commit не
+    # вызывается): страницы одного теста не должны достаться другому.
+    from core.test_runner import clear_caches
+    clear_caches()
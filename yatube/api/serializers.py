@@ -0,0 +1,33 @@
+# Сериализация в словари для JSON. Поля описаны функциями, поэтому
+# при ?fields=… вычисляются только запрошенные.
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+    'author': lambda comment: comment.author.username,
+}
+GROUP_FIELDS = {
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+}
+PROFILE_FIELDS = {
+    'username': lambda stats: stats.user.username,
+    'full_name': lambda stats: stats.user.get_full_name(),
+    'posts_count': lambda stats: stats.posts_count,
+    'following_count': lambda stats: stats.following_count,
+    'followers_count': lambda stats: stats.followers_count,
+}
+
+
+def serialize(obj, fields, available):
+    return {name: available[name](obj) for name in fields}
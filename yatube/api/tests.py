@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.holes import marker
+
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.settings import POSTS_PER_PAGE
+
+USERNAME = 'auth'
+READER = 'reader'
+SLUG = 'test-slug'
+POSTS_URL = reverse('api:posts')
+GROUP_URL = reverse('api:group', args=[SLUG])
+GROUP_POSTS_URL = reverse('api:group_posts', args=[SLUG])
+PROFILE_URL = reverse('api:profile', args=[USERNAME])
+PROFILE_POSTS_URL = reverse('api:profile_posts', args=[USERNAME])
+FOLLOW_URL = reverse('api:follow')
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=READER)
+        cls.group = Group.objects.create(
+            title='Группа', slug=SLUG, description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_PER_PAGE + 2)
+        )
+        cls.post = Post.objects.create(
+            text='Последний пост', author=cls.user, group=cls.group
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_and_comments(self):
+        response = self.client.get(reverse('api:post', args=[self.post.pk]))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json(), {
+            'id': self.post.pk,
+            'text': 'Последний пост',
+            'pub_date': self.post.pub_date.isoformat(),
+            'author': USERNAME,
+            'group': SLUG,
+            'image': None,
+        })
+        self.assertNotIn(b', ', response.content)
+        comments = self.client.get(
+            reverse('api:post_comments', args=[self.post.pk])
+        ).json()
+        self.assertEqual(
+            [comment['author'] for comment in comments['results']], [READER]
+        )
+        self.assertIsNone(comments['next'])
+
+    def test_feeds_walk_with_cursor(self):
+        for url in (POSTS_URL, GROUP_POSTS_URL, PROFILE_POSTS_URL):
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(len(first['results']), POSTS_PER_PAGE)
+                self.assertEqual(first['results'][0]['id'], self.post.pk)
+                second = self.client.get(first['next']).json()
+                self.assertEqual(len(second['results']), 3)
+                self.assertIsNone(second['next'])
+                self.assertEqual(
+                    self.client.get(second['previous']).json()['results'],
+                    first['results'],
+                )
+
+    def test_hole_marker_in_post_text(self):
+        hole = '["core/403csrf.html", {}]-->'
+        text = f'<!--hole {hole} {marker()}{hole}'
+        Post.objects.create(text=text, author=self.user)
+        response = self.client.get(POSTS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], text)
+
+    def test_sparse_fields(self):
+        response = self.client.get(POSTS_URL, {'fields': 'id,author'})
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'author'}
+        )
+        next_page = self.client.get(response.json()['next']).json()
+        self.assertEqual(set(next_page['results'][0]), {'id', 'author'})
+        response = self.client.get(POSTS_URL, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_group_and_profile(self):
+        self.assertEqual(
+            self.client.get(GROUP_URL, {'fields': 'title'}).json(),
+            {'title': 'Группа'}
+        )
+        profile = self.client.get(PROFILE_URL).json()
+        self.assertEqual(profile['posts_count'], POSTS_PER_PAGE + 3)
+        self.assertEqual(profile['followers_count'], 1)
+
+    def test_errors_are_json(self):
+        cases = (
+            (reverse('api:post', args=[0]), 404),
+            (reverse('api:profile', args=['nobody']), 404),
+            (FOLLOW_URL, 401),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.client.post(POSTS_URL).status_code, 405)
+
+    def test_follow_feed(self):
+        self.client.force_login(self.reader)
+        results = self.client.get(FOLLOW_URL).json()['results']
+        self.assertEqual(results[0]['id'], self.post.pk)
+
+    def test_conditional_requests(self):
+        for url in (POSTS_URL, PROFILE_URL, GROUP_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code, 304)
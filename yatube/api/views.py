@@ -0,0 +1,161 @@
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from posts import feeds, stats
+from posts.caching import cache_feed
+from posts.conditional import (
+    conditional, feed_versions, follow_versions, post_versions,
+    profile_versions
+)
+from posts.models import Post
+from posts.paginators import CursorPaginator
+from yatube.settings import POSTS_PER_PAGE
+
+from .serializers import (
+    COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS, PROFILE_FIELDS, serialize
+)
+
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def api_view(view):
+    """Только GET и HEAD; ошибки отдаются в JSON, а не HTML-страницей."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return json_response(view(request, *args, **kwargs))
+        except Http404:
+            return json_response({'error': 'Не найдено.'}, status=404)
+        except ApiError as error:
+            return json_response({'error': str(error)}, status=error.status)
+    return wrapper
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return json_response(
+                {'error': 'Нужна авторизация.'}, status=401
+            )
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def requested_fields(request, available):
+    """Поля из ?fields=a,b; без параметра — все."""
+    fields = request.GET.get('fields')
+    if not fields:
+        return tuple(available)
+    fields = tuple(dict.fromkeys(fields.split(',')))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return fields
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def page_data(request, page, available):
+    fields = requested_fields(request, available)
+    return {
+        'results': [serialize(obj, fields, available) for obj in page],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    }
+
+
+def posts_page(request, posts, field='pub_date'):
+    page = CursorPaginator(posts, POSTS_PER_PAGE, field=field).get_page(
+        request.GET.get('cursor')
+    )
+    return page_data(request, page, POST_FIELDS)
+
+
+@conditional(feed_versions)
+@cache_feed(feed_versions)
+@api_view
+def posts_list(request):
+    return posts_page(request, feeds.all_posts())
+
+
+@conditional(post_versions)
+@api_view
+def post_detail(request, post_id):
+    post = get_object_or_404(feeds.all_posts(), pk=post_id)
+    return serialize(
+        post, requested_fields(request, POST_FIELDS), POST_FIELDS
+    )
+
+
+@conditional(post_versions)
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    page = feeds.comments_page(post, request.GET.get('cursor'))
+    return page_data(request, page, COMMENT_FIELDS)
+
+
+@conditional(feed_versions)
+@api_view
+def group_detail(request, slug):
+    group = get_object_or_404(feeds.groups(), slug=slug)
+    return serialize(
+        group, requested_fields(request, GROUP_FIELDS), GROUP_FIELDS
+    )
+
+
+@conditional(feed_versions)
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(feeds.groups(), slug=slug)
+    return posts_page(request, feeds.group_posts(group))
+
+
+@conditional(profile_versions)
+@api_view
+def profile_detail(request, username):
+    user = get_object_or_404(feeds.users(), username=username)
+    profile = stats.for_user(user)
+    profile.user = user
+    return serialize(
+        profile,
+        requested_fields(request, PROFILE_FIELDS),
+        PROFILE_FIELDS,
+    )
+
+
+@conditional(profile_versions)
+@api_view
+def profile_posts(request, username):
+    user = get_object_or_404(feeds.users(), username=username)
+    return posts_page(request, feeds.author_posts(user))
+
+
+@api_login_required
+@conditional(follow_versions)
+@api_view
+def follow_posts(request):
+    return posts_page(
+        request, feeds.followed_posts(request.user), feeds.FOLLOWED_FIELD
+    )
@@ -0,0 +1,685 @@
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.signals import request_started
+
+from .versions import bump_counter
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    """
+    CREATE TABLE IF NOT EXISTS cache_size (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        total INTEGER NOT NULL
+    )
+    """,
+    'INSERT OR IGNORE INTO cache_size (id, total) VALUES (0, 0)',
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache
+    BEGIN
+        UPDATE cache_size SET total = total + new.size WHERE id = 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_size_update
+    AFTER UPDATE OF size ON cache BEGIN
+        UPDATE cache_size SET total = total + new.size - old.size
+        WHERE id = 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache
+    BEGIN
+        UPDATE cache_size SET total = total - old.size WHERE id = 0;
+    END
+    """,
+)
+# Ключи Django, у которых осмысленная группа длиннее двух сегментов.
+STATS_PREFIXES = (
+    'views.decorators.cache.cache_page',
+    'views.decorators.cache.cache_header',
+    'template.cache',
+)
+STATS_EVENTS = ('hits', 'misses', 'evictions')
+# Пределы INTEGER в SQLite; числа за ними хранятся через pickle.
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+# Хранилища и счётчики общие для всех потоков процесса: Django создаёт
+# отдельный экземпляр бэкенда на каждый поток.
+_stats = {}
+_stores = {}
+_local_versions = {}
+_stores_lock = threading.Lock()
+
+
+class CacheStats:
+    """Попадания, промахи и вытеснения по префиксам ключей.
+
+    Префикс — самый длинный подходящий из STATS_PREFIXES (и из
+    OPTIONS['STATS_PREFIXES']), иначе первые два сегмента ключа:
+    'posts:card', 'posts:count'. Счётчики живут в памяти процесса.
+    """
+
+    def __init__(self, prefixes=()):
+        self.prefixes = sorted(
+            {*STATS_PREFIXES, *prefixes}, key=len, reverse=True
+        )
+        self._lock = threading.Lock()
+        self._counters = defaultdict(Counter)
+
+    def prefix(self, key):
+        for prefix in self.prefixes:
+            if key.startswith(prefix):
+                return prefix
+        return re.match(r'[^:.]*[:.]?[^:.]*', key).group()
+
+    def record(self, event, keys):
+        with self._lock:
+            for key in keys:
+                self._counters[self.prefix(key)][event] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                prefix: {event: counter[event] for event in STATS_EVENTS}
+                for prefix, counter in sorted(self._counters.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+def shared_stats(name, options):
+    with _stores_lock:
+        if name not in _stats:
+            _stats[name] = CacheStats(options.get('STATS_PREFIXES', ()))
+        return _stats[name]
+
+
+UPSERT = """
+    INSERT INTO cache (key, value, expires, accessed, size)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        value = excluded.value,
+        expires = excluded.expires,
+        accessed = excluded.accessed,
+        size = excluded.size
+"""
+# Оставляет самые свежие по обращению записи суммарным размером не
+# больше заданного, остальные удаляет.
+EVICT = """
+    DELETE FROM cache WHERE key IN (
+        SELECT key FROM (
+            SELECT key, SUM(size) OVER (
+                ORDER BY accessed DESC, key
+            ) AS kept
+            FROM cache
+        ) WHERE kept > ?
+    ) RETURNING key
+"""
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на машине.
+
+    База работает в режиме WAL: читатели не блокируют друг друга и
+    писателя. Размер ограничен в байтах (OPTIONS['MAX_BYTES']); при
+    переполнении вытесняются давно не читанные записи, пока не
+    останется CULL_TO доля лимита. Время обращения обновляется не чаще
+    раза в ACCESS_RESOLUTION секунд, чтобы чтение почти никогда не
+    превращалось в запись. Целые числа в пределах int64 хранятся как
+    INTEGER, поэтому incr — один атомарный UPDATE.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self.cull_to = float(options.get('CULL_TO', 0.9))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.stats = shared_stats(location, options)
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # Соединение своё у каждого потока и каждого процесса после fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _connect(self):
+        directory = os.path.dirname(self.location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.location, timeout=30, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE сразу берёт блокировку записи, поэтому
+        # чтение и запись внутри транзакции атомарны между процессами.
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _encode(self, value):
+        if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _size(self, key, value):
+        return len(key) + (8 if isinstance(value, int) else len(value))
+
+    def _row(self, key, value, timeout, now):
+        value = self._encode(value)
+        expires = self.get_backend_timeout(timeout)
+        return key, value, expires, now, self._size(key, value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_read(self, rows, now):
+        stale = [
+            (now, key) for key, accessed in rows
+            if now - accessed > self.access_resolution
+        ]
+        if stale:
+            self._connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+
+    def _evict(self, now):
+        connection = self._connection
+        total, = connection.execute(
+            'SELECT total FROM cache_size WHERE id = 0'
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        evicted = connection.execute(
+            EVICT, (int(self.max_bytes * self.cull_to),)
+        ).fetchall()
+        # Ключ в базе — результат make_key, исходный идёт после версии.
+        self.stats.record(
+            'evictions', (key.split(':', 2)[-1] for key, in evicted)
+        )
+
+    def get(self, key, default=None, version=None):
+        name = key
+        key = self._key(key, version)
+        now = time.time()
+        row = self._connection.execute(
+            'SELECT value, accessed FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, now),
+        ).fetchone()
+        if row is None:
+            self.stats.record('misses', (name,))
+            return default
+        self.stats.record('hits', (name,))
+        self._touch_read([(key, row[1])], now)
+        return self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        if not names:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(names))
+        rows = self._connection.execute(
+            'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*names, now),
+        ).fetchall()
+        self._touch_read([(key, accessed) for key, _, accessed in rows], now)
+        found = {names[key]: self._decode(value) for key, value, _ in rows}
+        self.stats.record('hits', found)
+        self.stats.record(
+            'misses', (name for name in names.values() if name not in found)
+        )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [
+            self._row(self._key(key, version), value, timeout, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(UPSERT, rows)
+            self._evict(now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        row = self._row(self._key(key, version), value, timeout, now)
+        with self._transaction() as connection:
+            # Перезаписывается только просроченная запись.
+            cursor = connection.execute(
+                f'{UPSERT} WHERE cache.expires IS NOT NULL '
+                'AND cache.expires <= ?',
+                (*row, now),
+            )
+            self._evict(now)
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        if INT64_MIN <= delta <= INT64_MAX:
+            # При выходе суммы за int64 SQLite сделал бы её REAL.
+            rows = self._connection.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' AND value BETWEEN ? AND ? "
+                'AND (expires IS NULL OR expires > ?) RETURNING value',
+                (
+                    delta, key, INT64_MIN - min(delta, 0),
+                    INT64_MAX - max(delta, 0), now,
+                ),
+            ).fetchall()
+            if rows:
+                return rows[0][0]
+        return self._incr_pickled(key, delta, now)
+
+    def _incr_pickled(self, key, delta, now):
+        # Редкий путь для чисел за пределами int64.
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            value = None if row is None else self._decode(row[0])
+            if type(value) is not int:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            encoded = self._encode(value)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (encoded, self._size(key, encoded), key),
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь поток: открывать базу на каждый запрос
+        # дороже, чем держать её открытой.
+        pass
+
+
+class LRUStore:
+    """Записи одного MemoryCache в порядке обращения, от старых к новым."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # ключ -> (исходный ключ, pickle, срок, размер)
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+
+def shared_store(name):
+    with _stores_lock:
+        return _stores.setdefault(name, LRUStore())
+
+
+class MemoryCache(BaseCache):
+    """Кэш в памяти процесса с лимитом в байтах и честным LRU.
+
+    В отличие от LocMemCache, который считает записи и при переполнении
+    выбрасывает случайную треть, здесь размер записи — длина ключа и
+    pickle значения, а вытесняются записи, к которым дольше всего не
+    обращались, ровно столько, сколько нужно под новую. Запись больше
+    всего лимита не сохраняется. Счётчики — в атрибуте stats.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.max_bytes = int(options.get('MAX_BYTES', 16 * 1024 * 1024))
+        self.stats = shared_stats(name, options)
+        self._store = shared_store(name)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _lookup(self, key, now):
+        entry = self._store.entries.get(key)
+        if entry is None:
+            return None
+        expires = entry[2]
+        if expires is not None and expires <= now:
+            self._delete(key)
+            return None
+        self._store.entries.move_to_end(key)
+        return entry
+
+    def _delete(self, key):
+        entry = self._store.entries.pop(key, None)
+        if entry is not None:
+            self._store.bytes -= entry[3]
+        return entry is not None
+
+    def _set(self, name, key, pickled, expires):
+        self._delete(key)
+        size = len(key) + len(pickled)
+        if size > self.max_bytes:
+            return
+        store = self._store
+        evicted = []
+        while store.bytes + size > self.max_bytes:
+            _, (evicted_name, _, _, evicted_size) = store.entries.popitem(
+                last=False
+            )
+            store.bytes -= evicted_size
+            evicted.append(evicted_name)
+        store.entries[key] = (name, pickled, expires, size)
+        store.bytes += size
+        self.stats.record('evictions', evicted)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found = {}
+        with self._store.lock:
+            for key, name in names.items():
+                entry = self._lookup(key, now)
+                if entry is not None:
+                    found[name] = entry[1]
+        self.stats.record('hits', found)
+        self.stats.record(
+            'misses', (name for name in names.values() if name not in found)
+        )
+        return {name: pickle.loads(value) for name, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (name, self._key(name, version),
+             pickle.dumps(value, self.pickle_protocol))
+            for name, value in data.items()
+        ]
+        with self._store.lock:
+            for name, key, pickled in rows:
+                self._set(name, key, pickled, expires)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = key
+        key = self._key(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._store.lock:
+            if self._lookup(key, time.time()) is not None:
+                return False
+            self._set(name, key, pickled, self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        name = key
+        key = self._key(key, version)
+        with self._store.lock:
+            entry = self._lookup(key, time.time())
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(entry[1]) + delta
+            self._set(
+                name, key, pickle.dumps(value, self.pickle_protocol),
+                entry[2],
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._store.lock:
+            entry = self._lookup(key, time.time())
+            if entry is None:
+                return False
+            name, pickled, _, size = entry
+            self._store.entries[key] = (
+                name, pickled, self.get_backend_timeout(timeout), size
+            )
+            return True
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        with self._store.lock:
+            return self._lookup(key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._store.lock:
+            self._delete(key)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._store.lock:
+            for key in keys:
+                self._delete(key)
+
+    def clear(self):
+        with self._store.lock:
+            self._store.entries.clear()
+            self._store.bytes = 0
+
+
+class TieredCache(BaseCache):
+    """MemoryCache процесса перед общим кэшем из LOCATION (псевдоним).
+
+    Чтения сначала идут в локальный слой, промахи — в общий кэш и
+    оседают локально не дольше OPTIONS['LOCAL_TIMEOUT'] секунд. set
+    пишет в оба слоя, и другие процессы увидят новое значение через
+    LOCAL_TIMEOUT. add, incr, touch и has_key работают только с общим
+    кэшем. incr, delete и clear повышают общую версию локальных слоёв.
+    Каждый процесс сверяет её не чаще раза за запрос, а вне запросов —
+    раз в LOCAL_TIMEOUT, и при расхождении очищает свой слой.
+    Блокировки и служебные счётчики идут мимо него, см. shared_cache.
+    """
+
+    VERSION_KEY = 'core:tiered:version'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self.local_name = f'tiered:{location}'
+        self.local = MemoryCache(self.local_name, {'OPTIONS': {
+            'MAX_BYTES': options.get('LOCAL_MAX_BYTES', 8 * 1024 * 1024),
+            'STATS_PREFIXES': options.get('STATS_PREFIXES', ()),
+        }})
+        self.stats = self.local.stats
+        self._checked_at = None
+
+    @property
+    def shared(self):
+        return caches[self.location]
+
+    def new_request(self):
+        self._checked_at = None
+
+    def _check_version(self):
+        now = time.monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < self.local_timeout
+        ):
+            return
+        self._checked_at = now
+        version = self.shared.get(self.VERSION_KEY)
+        if _local_versions.get(self.local_name) != version:
+            self.local.clear()
+            _local_versions[self.local_name] = version
+
+    def _bump_version(self):
+        bump_counter(self.shared, self.VERSION_KEY)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        found = self.get_many([key], version=version)
+        return found.get(key, default)
+
+    def get_many(self, keys, version=None):
+        self._check_version()
+        found = self.local.get_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            self.local.set_many(
+                fetched, self.local_timeout, version=version
+            )
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout=timeout, version=version)
+        self.local.set_many(
+            data, self._local_timeout(timeout), version=version
+        )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.add(key, value, timeout=timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        value = self.shared.incr(key, delta, version=version)
+        self._bump_version()
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def has_key(self, key, version=None):
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+        self._bump_version()
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+        self._bump_version()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """Кэш alias без локального слоя TieredCache.
+
+    Для блокировок и служебных счётчиков, которые не читаются через
+    локальный слой: их delete и incr не должны очищать локальные слои
+    всех процессов.
+    """
+    backend = caches[alias]
+    if isinstance(backend, TieredCache):
+        return backend.shared
+    return backend
+
+
+def new_request(**kwargs):
+    for cache in caches.all():
+        if isinstance(cache, TieredCache):
+            cache.new_request()
+
+
+request_started.connect(new_request)
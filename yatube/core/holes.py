@@ -0,0 +1,59 @@
+import json
+import re
+from functools import lru_cache
+
+from django.template.loader import render_to_string
+from django.utils.crypto import salted_hmac
+
+
+@lru_cache(maxsize=None)
+def marker():
+    """Начало метки. Выводится из SECRET_KEY, поэтому своё у каждой
+    установки и не может быть угадано автором поста."""
+    digest = salted_hmac('core.holes', 'placeholder').hexdigest()[:20]
+    return f'<!--hole-{digest} '
+
+
+@lru_cache(maxsize=None)
+def _pattern():
+    return re.compile(re.escape(marker()) + r'(.*?)-->')
+
+
+def placeholder(template_name, params):
+    """Метка на месте личной части страницы.
+
+    В JSON экранируются угловые скобки, чтобы параметры не закрыли
+    комментарий.
+    """
+    data = json.dumps([template_name, params], ensure_ascii=False)
+    data = data.replace('<', '\\u003c').replace('>', '\\u003e')
+    return f'{marker()}{data}-->'
+
+
+def punch_holes(request):
+    """Дальше шаблон рендерится без личных частей, вместо них метки."""
+    request.punch_holes = True
+
+
+def fill_holes(request, response):
+    """Рендерит личные части для этого запроса и вставляет их на
+    место меток. Фрагмент видит только свои параметры и данные
+    контекст-процессоров (request, user, csrf_token).
+
+    Метки ставит только тег {% hole %}, поэтому ответы не в HTML
+    (JSON, Atom) возвращаются как есть.
+    """
+    if (
+        response.streaming
+        or not response.get('Content-Type', '').startswith('text/html')
+        or marker().encode() not in response.content
+    ):
+        return response
+
+    def fill(match):
+        template_name, params = json.loads(match.group(1))
+        return render_to_string(template_name, params, request=request)
+
+    content = response.content.decode(response.charset)
+    response.content = _pattern().sub(fill, content)
+    return response
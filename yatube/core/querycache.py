@@ -0,0 +1,170 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .cache import CacheStats, shared_cache
+from .singleflight import get_or_compute
+from .versions import CommitBatch, bump_counter, read_counters
+
+QUERY_KEY = 'core:query:{name}:{digest}'
+TABLE_VERSION_KEY = 'core:query:table:{table}'
+READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?', re.IGNORECASE)
+WRITTEN_TABLE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO'
+    r'|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+"?(\w+)"?',
+    re.IGNORECASE,
+)
+
+# Попадания и промахи по именам, с которыми запросы включили в кэш.
+stats = CacheStats()
+
+
+def read_tables(sql):
+    return set(READ_TABLES.findall(sql))
+
+
+def written_table(sql):
+    match = WRITTEN_TABLE.match(sql)
+    return match.group(1) if match else None
+
+
+def table_versions(tables):
+    # Версии читаются из общего кэша мимо локального слоя: так запись
+    # видна другим процессам сразу, а её incr не очищает их слои.
+    keys = {TABLE_VERSION_KEY.format(table=table): table for table in tables}
+    versions = read_counters(shared_cache(), list(keys))
+    return sorted((keys[key], version) for key, version in versions.items())
+
+
+def bump_tables(tables):
+    shared = shared_cache()
+    for table in tables:
+        bump_counter(shared, TABLE_VERSION_KEY.format(table=table))
+
+
+# Таблицы, изменённые в незавершённой транзакции соединения.
+dirty_tables = CommitBatch('query_cache_dirty', bump_tables)
+
+
+def track_writes(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    table = written_table(sql)
+    if table in settings.QUERY_CACHE_TABLES:
+        dirty_tables.add(context['connection'], table)
+    return result
+
+
+def install(sender, connection, **kwargs):
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+connection_created.connect(install)
+
+
+def query_key(queryset, kind):
+    """Ключ результата или None, если запрос кэшировать нельзя.
+
+    В ключ входят SQL, параметры и версии всех таблиц, которые запрос
+    читает, поэтому запись в любую из них делает старые ключи
+    недостижимыми. Запрос к таблице вне QUERY_CACHE_TABLES или к
+    таблице, изменённой в текущей незавершённой транзакции, идёт
+    мимо кэша.
+    """
+    try:
+        sql, params = queryset.query.get_compiler(
+            using=queryset.db
+        ).as_sql()
+    except EmptyResultSet:
+        return None
+    tables = read_tables(sql)
+    if not tables <= set(settings.QUERY_CACHE_TABLES):
+        return None
+    if tables & dirty_tables.pending(connections[queryset.db]):
+        return None
+    raw = '|'.join(map(str, (
+        kind, queryset.db, queryset._iterable_class.__name__, sql, params,
+        table_versions(tables),
+    )))
+    return QUERY_KEY.format(
+        name=queryset.query_cache_name,
+        digest=hashlib.md5(raw.encode()).hexdigest(),
+    )
+
+
+class CachedQuerySetMixin:
+    query_cache_name = None
+    query_cache_timeout = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.query_cache_name = self.query_cache_name
+        clone.query_cache_timeout = self.query_cache_timeout
+        return clone
+
+    def _uncached(self):
+        clone = self._chain()
+        clone.query_cache_name = None
+        return clone
+
+    def _cached(self, kind, compute):
+        key = query_key(self, kind) if self.query_cache_name else None
+        if key is None:
+            return compute()
+        missed = []
+
+        def counted():
+            missed.append(True)
+            return compute()
+
+        result = get_or_compute(key, counted, self.query_cache_timeout)
+        stats.record('misses' if missed else 'hits', (self.query_cache_name,))
+        return result
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.query_cache_name:
+            self._result_cache = self._cached(
+                'rows', lambda: list(self._uncached())
+            )
+            # Связанные через prefetch_related объекты уже в кэше.
+            self._prefetch_done = True
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None or not self.query_cache_name:
+            return super().count()
+        return self._cached('count', lambda: self._uncached().count())
+
+    def exists(self):
+        if self._result_cache is not None or not self.query_cache_name:
+            return super().exists()
+        return self._cached('exists', lambda: self._uncached().exists())
+
+
+_cached_classes = {}
+
+
+def cached(queryset, name, timeout=None):
+    """Копия queryset, результаты которой берутся из кэша.
+
+    name — имя для статистики попаданий. Кэшируются строки (вместе с
+    select_related и prefetch_related), count() и exists(). Записи в
+    таблицы запроса сбрасывают результат после коммита. Таблицы,
+    которые меняют только триггеры БД (posts_post_fts), не
+    отслеживаются: такие запросы кэшировать нельзя.
+    """
+    queryset = queryset.all()
+    base = type(queryset)
+    if not issubclass(base, CachedQuerySetMixin):
+        if base not in _cached_classes:
+            _cached_classes[base] = type(
+                f'Cached{base.__name__}', (CachedQuerySetMixin, base), {}
+            )
+        queryset.__class__ = _cached_classes[base]
+    queryset.query_cache_name = name
+    queryset.query_cache_timeout = timeout or settings.QUERY_CACHE_TIMEOUT
+    return queryset
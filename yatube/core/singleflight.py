@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import shared_cache
+
+LOCK_KEY = '{key}:lock'
+POLL_INTERVAL = 0.05
+
+
+def jittered(timeout):
+    """Срок жизни, случайно укороченный не больше чем на долю
+    CACHE_TTL_JITTER: записи, созданные вместе, истекают вразнобой."""
+    return timeout * (1 - random.random() * settings.CACHE_TTL_JITTER)
+
+
+def get_or_compute(key, compute, timeout, cacheable=None):
+    """Значение из кэша или compute(), причём пересчитывает его
+    одновременно только один запрос.
+
+    Запись свежая timeout секунд (с разбросом) и хранится ещё
+    CACHE_STALE_TIMEOUT. Устаревшую пересчитывает тот, кто взял
+    блокировку, остальные получают старую копию. Если записи нет
+    совсем, остальные ждут результат до CACHE_LOCK_WAIT секунд и лишь
+    потом считают сами. cacheable(value) решает, сохранять ли результат.
+    """
+    lock = LOCK_KEY.format(key=key)
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until > time.time() or not _acquire(lock):
+            return value
+        return _compute(key, lock, compute, timeout, cacheable)
+    if _acquire(lock):
+        return _compute(key, lock, compute, timeout, cacheable)
+    entry = _wait(key, lock)
+    if entry is not None:
+        return entry[0]
+    return _compute(key, None, compute, timeout, cacheable)
+
+
+def _acquire(lock):
+    # Блокировка истекает сама, если её владелец упал.
+    return shared_cache().add(lock, 1, settings.CACHE_LOCK_TIMEOUT)
+
+
+def _wait(key, lock):
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None or not shared_cache().has_key(lock):
+            return entry
+    return None
+
+
+def _compute(key, lock, compute, timeout, cacheable):
+    try:
+        value = compute()
+        if cacheable is None or cacheable(value):
+            fresh = jittered(timeout)
+            cache.set(
+                key, (value, time.time() + fresh),
+                fresh + settings.CACHE_STALE_TIMEOUT,
+            )
+        return value
+    finally:
+        if lock is not None:
+            shared_cache().delete(lock)
@@ -0,0 +1,22 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import placeholder
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Личная часть страницы: {% hole 'шаблон' параметр=значение %}.
+
+    Обычно работает как include. Если страница кэшируется целиком для
+    всех, выводит метку, а фрагмент рендерится после чтения из кэша;
+    поэтому параметры должны сериализоваться в JSON.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(placeholder(template_name, params))
+    fragment = context.template.engine.get_template(template_name)
+    with context.push(**params):
+        return fragment.render(context)
@@ -0,0 +1,45 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def isolated_caches(directory):
+    """Копия CACHES, в которой файловые кэши лежат в directory."""
+    isolated = copy.deepcopy(settings.CACHES)
+    for alias, params in isolated.items():
+        if params['BACKEND'] == 'core.cache.SQLiteCache':
+            params['LOCATION'] = os.path.join(directory, f'{alias}.sqlite3')
+    return isolated
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """Запускает тесты со своим пустым кэшем во временном каталоге.
+
+    Тестовая база каждый раз создаётся заново, поэтому страницы и
+    счётчики из рабочего кэша ей не подходят, а рабочий кэш тесты не
+    трогают.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp()
+        self.cache_settings = override_settings(
+            CACHES=isolated_caches(self.cache_directory)
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_directory)
+        super().teardown_test_environment(**kwargs)
@@ -1,4 +1,37 @@
-from django.test import Client, TestCase
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings
+)
+from django.urls import reverse
+
+from .cache import (
+    CacheStats, MemoryCache, SQLiteCache, TieredCache, new_request
+)
+from .holes import fill_holes, marker, placeholder
+from .querycache import cached, stats as query_stats
+from .singleflight import LOCK_KEY, get_or_compute, jittered
+from .versions import bump_counter, read_counter
+from posts import feeds
+from posts.follows import follow
+from posts.models import Follow, Group, Post, TimelineEntry
+
+# Замер скорости кэшей запускается только по запросу, с заданным
+# числом операций: CACHE_BENCHMARK_OPS=100000 python manage.py test core
+BENCHMARK_OPS = int(os.environ.get('CACHE_BENCHMARK_OPS', 0))
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +44,505 @@ class ViewTestClass(TestCase):
         response = ViewTestClass.guest_client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class HolesTest(SimpleTestCase):
+    def test_placeholder_filled_with_fragment(self):
+        mark = placeholder('core/403csrf.html', {'note': '--> <b>'})
+        self.assertNotIn('<b>', mark)
+        self.assertEqual(mark.count('-->'), 1)
+        response = fill_holes(
+            RequestFactory().get('/'), HttpResponse(f'до {mark} после')
+        )
+        content = response.content.decode()
+        self.assertNotIn(marker(), content)
+        self.assertTrue(content.startswith('до '))
+        self.assertTrue(content.endswith(' после'))
+
+    def test_only_html_filled(self):
+        body = f'{{"text": "{placeholder("core/403csrf.html", {})}"}}'
+        response = fill_holes(
+            RequestFactory().get('/'),
+            HttpResponse(body, content_type='application/json'),
+        )
+        self.assertEqual(response.content.decode(), body)
+
+
+@override_settings(CACHE_LOCK_WAIT=2, CACHE_TTL_JITTER=0.1)
+class SingleFlightTest(SimpleTestCase):
+    KEY = 'core:test:singleflight'
+
+    def setUp(self):
+        cache.delete_many([self.KEY, LOCK_KEY.format(key=self.KEY)])
+        self.calls = 0
+
+    def get(self):
+        return get_or_compute(self.KEY, self.compute(), 60)
+
+    def compute(self, value='свежее', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_cached_until_fresh(self):
+        self.assertEqual(self.get(), 'свежее')
+        self.assertEqual(self.get(), 'свежее')
+        self.assertEqual(self.calls, 1)
+        self.assertFalse(cache.has_key(LOCK_KEY.format(key=self.KEY)))
+
+    def test_stale_served_while_other_recomputes(self):
+        cache.set(self.KEY, ('старое', time.time() - 1))
+        cache.add(LOCK_KEY.format(key=self.KEY), 1)
+        self.assertEqual(self.get(), 'старое')
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_recomputed_by_lock_owner(self):
+        cache.set(self.KEY, ('старое', time.time() - 1))
+        self.assertEqual(self.get(), 'свежее')
+        self.assertEqual(cache.get(self.KEY)[0], 'свежее')
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+
+        def request():
+            results.append(
+                get_or_compute(self.KEY, self.compute(delay=0.3), 60)
+            )
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['свежее'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_uncacheable_not_stored(self):
+        get_or_compute(
+            self.KEY, self.compute(), 60, cacheable=lambda value: False
+        )
+        self.assertIsNone(cache.get(self.KEY))
+
+    def test_jitter_shortens_timeout(self):
+        timeouts = {jittered(100) for _ in range(50)}
+        self.assertTrue(all(90 <= timeout <= 100 for timeout in timeouts))
+        self.assertGreater(len(timeouts), 1)
+
+
+def incr_many(cache, times):
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_get_set_many(self):
+        self.cache.set('a', {'x': 1})
+        self.cache.set_many({'b': 2, 'c': [3]})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'd']),
+            {'a': {'x': 1}, 'b': 2, 'c': [3]},
+        )
+        self.assertIsNone(self.cache.get('d'))
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'c': [3]})
+
+    def test_shared_between_instances(self):
+        self.cache.set('page', 'html')
+        self.assertEqual(self.make_cache().get('page'), 'html')
+        self.make_cache().clear()
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_expiry_and_add(self):
+        self.cache.set('old', 1, timeout=-1)
+        self.assertFalse(self.cache.has_key('old'))
+        self.assertTrue(self.cache.add('old', 2))
+        self.assertFalse(self.cache.add('old', 3))
+        self.assertEqual(self.cache.get('old'), 2)
+        self.assertTrue(self.cache.touch('old', timeout=-1))
+        self.assertIsNone(self.cache.get('old'))
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('text', 'a')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+
+    def test_ints_beyond_int64(self):
+        self.cache.set_many({'big': 2 ** 63, 'small': -2 ** 63 - 1})
+        self.assertEqual(self.cache.get('big'), 2 ** 63)
+        self.assertEqual(self.cache.get('small'), -2 ** 63 - 1)
+        self.cache.set('counter', 2 ** 63 - 1)
+        self.assertEqual(self.cache.incr('counter'), 2 ** 63)
+        self.assertEqual(self.cache.incr('counter', 2 ** 64), 3 * 2 ** 63)
+        self.assertEqual(self.cache.decr('counter', 3 * 2 ** 63), 0)
+        self.assertEqual(self.cache.incr('counter'), 1)
+
+    def test_incr_atomic_between_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=incr_many, args=(self.cache, 200))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        value = 'x' * 1000
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        size += len(self.cache.make_key('a'))
+        cache = self.make_cache(
+            MAX_BYTES=size * 4, CULL_TO=0.5, ACCESS_RESOLUTION=0
+        )
+        for name in 'abcd':
+            cache.set(name, value)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('e', value)
+        self.assertEqual(set(cache.get_many('abcde')), {'a', 'e'})
+
+    def test_evictions_counted(self):
+        cache = self.make_cache(MAX_BYTES=1000, CULL_TO=0.5)
+        cache.set_many({f'posts:card:{i}': 'x' * 300 for i in range(3)})
+        cache.set('posts:card:3', 'x' * 300)
+        cache.get('posts:card:3')
+        self.assertEqual(cache.stats.snapshot(), {
+            'posts:card': {'hits': 1, 'misses': 0, 'evictions': 3},
+        })
+
+
+class MemoryCacheTest(SimpleTestCase):
+    def make_cache(self, name, **options):
+        cache = MemoryCache(name, {'OPTIONS': options})
+        self.addCleanup(cache.clear)
+        return cache
+
+    def entry_size(self, cache, key, value):
+        return len(cache.make_key(key)) + len(
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        )
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        value = 'x' * 100
+        size = self.entry_size(MemoryCache('', {}), 'a', value)
+        cache = self.make_cache('lru', MAX_BYTES=size * 3)
+        cache.set_many({'a': value, 'b': value, 'c': value})
+        cache.get('a')
+        cache.set('d', value)
+        self.assertEqual(set(cache.get_many('abcd')), {'a', 'c', 'd'})
+        cache.set('big', 'x' * size)
+        self.assertEqual(set(cache.get_many('acd')), {'d'})
+        self.assertEqual(cache.get('big'), 'x' * size)
+
+    def test_too_large_value_not_stored(self):
+        cache = self.make_cache('large', MAX_BYTES=100)
+        cache.set('small', 1)
+        cache.set('large', 'x' * 200)
+        self.assertIsNone(cache.get('large'))
+        self.assertEqual(cache.get('small'), 1)
+
+    def test_shared_between_threads_instances(self):
+        self.make_cache('shared').set('key', 1, timeout=None)
+        cache = self.make_cache('shared')
+        self.assertEqual(cache.incr('key', 2), 3)
+        self.assertFalse(cache.add('key', 5))
+        self.assertTrue(cache.touch('key', -1))
+        self.assertTrue(cache.add('key', 5))
+        self.assertEqual(cache.get('key'), 5)
+
+    def test_stats_by_prefix(self):
+        page = 'views.decorators.cache.cache_page.feed.1.GET.x'
+        cache = self.make_cache(
+            'stats', MAX_BYTES=self.entry_size(MemoryCache('', {}), page, '')
+        )
+        cache.stats.reset()
+        cache.set('posts:count:1', 1)
+        cache.get_many(['posts:count:1', 'posts:count:2'])
+        cache.get('template.cache.card.abc')
+        cache.set(page, '')
+        self.assertEqual(cache.stats.snapshot(), {
+            'posts:count': {'hits': 1, 'misses': 1, 'evictions': 1},
+            'template.cache': {'hits': 0, 'misses': 1, 'evictions': 0},
+        })
+
+    def test_prefixes(self):
+        stats = CacheStats(prefixes=('posts:feed:generation',))
+        self.assertEqual(stats.prefix('posts:feed:generation'),
+                         'posts:feed:generation')
+        self.assertEqual(stats.prefix('posts:feed:changed'), 'posts:feed')
+        self.assertEqual(stats.prefix('feed.5.x'), 'feed.5')
+        self.assertEqual(stats.prefix('plain'), 'plain')
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.shared = {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+        }
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'tiered-shared': self.shared,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = self.make_process(f'{self.id()}:first')
+        # Второй экземпляр со своим локальным слоем — как другой воркер.
+        self.other = self.make_process(f'{self.id()}:second')
+
+    def make_process(self, name):
+        tiered = TieredCache('tiered-shared', {
+            'OPTIONS': {'LOCAL_TIMEOUT': 0.2},
+        })
+        tiered.local_name = name
+        tiered.local = MemoryCache(name, {})
+        self.addCleanup(tiered.local.clear)
+        return tiered
+
+    def shared_reads(self):
+        stats = self.cache.shared.stats.snapshot().values()
+        return sum(counter['hits'] + counter['misses'] for counter in stats)
+
+    def test_hot_keys_read_locally(self):
+        self.cache.set_many({'posts:group:cats': 1, 'posts:page:1': 'html'})
+        self.cache.get('posts:group:cats')
+        reads = self.shared_reads()
+        for _ in range(3):
+            self.cache.get('posts:group:cats')
+            self.cache.get_many(['posts:group:cats', 'posts:page:1'])
+        self.assertEqual(self.shared_reads(), reads)
+
+    def test_version_checked_once_per_request(self):
+        new_request()
+        self.cache.new_request()
+        self.cache.get('key')
+        reads = self.shared_reads()
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        self.cache.get('key')
+        self.assertEqual(self.shared_reads(), reads)
+
+    def test_other_process_set_visible_after_local_timeout(self):
+        self.cache.set('key', 'старое')
+        self.other.set('key', 'новое')
+        self.assertEqual(self.cache.get('key'), 'старое')
+        time.sleep(0.25)
+        self.assertEqual(self.cache.get('key'), 'новое')
+
+    def test_other_process_delete_and_incr_visible_next_request(self):
+        self.cache.set_many({'key': 'значение', 'counter': 1})
+        self.cache.get_many(['key', 'counter'])
+        self.other.delete('key')
+        self.other.incr('counter')
+        self.cache.new_request()
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('counter'), 2)
+
+    def test_add_and_has_key_use_shared_cache(self):
+        self.assertTrue(self.other.add('lock', 1))
+        self.assertFalse(self.cache.add('lock', 1))
+        self.assertTrue(self.cache.has_key('lock'))
+
+    def test_singleflight_recompute_keeps_local_tier(self):
+        with override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.TieredCache',
+                'LOCATION': 'tiered-shared',
+                'OPTIONS': {'LOCAL_TIMEOUT': 60},
+            },
+            'tiered-shared': self.shared,
+        }):
+            tiered = caches['default']
+            self.addCleanup(tiered.local.clear)
+            tiered.set('posts:group:cats', 1)
+            version = tiered.shared.get(TieredCache.VERSION_KEY)
+            tiered.set('posts:page:1', ('старое', time.time() - 1))
+            self.assertEqual(
+                get_or_compute('posts:page:1', lambda: 'свежее', 60),
+                'свежее',
+            )
+            self.assertEqual(
+                tiered.shared.get(TieredCache.VERSION_KEY), version
+            )
+            self.assertEqual(tiered.local.get('posts:group:cats'), 1)
+
+
+class VersionCounterTest(SimpleTestCase):
+    def test_counter_survives_eviction(self):
+        store = LocMemCache('versions', {})
+        with mock.patch(
+            'core.versions._initial_value', side_effect=[1000, 2000]
+        ):
+            self.assertEqual(read_counter(store, 'version'), 1000)
+            bump_counter(store, 'version')
+            self.assertEqual(read_counter(store, 'version'), 1001)
+            # Вытесненный счётчик заводится по часам, а не с нуля.
+            store.delete('version')
+            bump_counter(store, 'version')
+            self.assertEqual(read_counter(store, 'version'), 2000)
+
+
+class QueryCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        query_stats.reset()
+        self.user = get_user_model().objects.create_user('reader')
+        self.author = get_user_model().objects.create_user('author')
+        self.group = Group.objects.create(title='Коты', slug='cats')
+
+    def group_title(self):
+        return cached(Group.objects, 'groups').get(slug='cats').title
+
+    def test_results_cached_until_table_written(self):
+        self.assertEqual(self.group_title(), 'Коты')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.group_title(), 'Коты')
+        Group.objects.filter(slug='cats').update(title='Кошки')
+        self.assertEqual(self.group_title(), 'Кошки')
+        self.assertEqual(query_stats.snapshot(), {
+            'groups': {'hits': 1, 'misses': 2, 'evictions': 0},
+        })
+
+    def test_count_exists_and_select_related(self):
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+        posts = cached(Post.objects.select_related('group'), 'posts')
+        posts.count()
+        posts.exists()
+        list(posts)
+        with self.assertNumQueries(0):
+            self.assertEqual(posts.count(), 1)
+            self.assertTrue(posts.exists())
+            self.assertEqual(list(posts.all())[0].group.title, 'Коты')
+
+    def test_feeds_cache_no_credentials(self):
+        Post.objects.create(text='Пост', author=self.author)
+        user = feeds.users().get(username='author')
+        author = list(feeds.all_posts())[0].author
+        for cached_user in (user, author):
+            self.assertEqual(cached_user.username, 'author')
+            self.assertNotIn('password', cached_user.__dict__)
+            self.assertNotIn('email', cached_user.__dict__)
+
+    def test_raw_sql_write_invalidates(self):
+        following = cached(
+            Follow.objects.filter(user=self.user, author=self.author),
+            'following',
+        )
+        self.assertFalse(following.exists())
+        follow(self.user, ['author'])
+        self.assertTrue(following.all().exists())
+
+    def test_uncommitted_writes_bypass_cache(self):
+        self.group_title()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Group.objects.filter(slug='cats').update(title='Черновик')
+                self.assertEqual(self.group_title(), 'Черновик')
+                raise RuntimeError
+        self.assertEqual(self.group_title(), 'Коты')
+
+    def test_write_after_savepoint_rollback_invalidates(self):
+        self.group_title()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Group.objects.filter(slug='cats').update(title='Нет')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            Group.objects.filter(slug='cats').update(title='Кошки')
+        self.assertEqual(self.group_title(), 'Кошки')
+
+    def test_untracked_tables_not_cached(self):
+        entries = cached(TimelineEntry.objects.all(), 'timeline')
+        list(entries)
+        with self.assertNumQueries(1):
+            list(entries.all())
+
+
+class CacheStatsViewTest(TestCase):
+    def test_staff_only(self):
+        user = get_user_model().objects.create_user('staff', is_staff=True)
+        url = reverse('cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', response.json())
+
+
+@skipUnless(BENCHMARK_OPS, 'задайте CACHE_BENCHMARK_OPS')
+class CacheBenchmarkTest(SimpleTestCase):
+    """Замер против LocMemCache. Свой кэш медленнее словаря в памяти,
+    зато один на все процессы: промах в одном воркере не повторяется в
+    остальных, а сброс поколения видят все."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.caches = {
+            'locmem': LocMemCache('benchmark', {
+                'OPTIONS': {'MAX_ENTRIES': BENCHMARK_OPS * 2},
+            }),
+            'sqlite': SQLiteCache(
+                os.path.join(directory, 'cache.sqlite3'), {}
+            ),
+            'memory': MemoryCache('benchmark', {}),
+        }
+
+    def measure(self, cache):
+        value = 'x' * 2000
+        keys = [f'key{i}' for i in range(BENCHMARK_OPS)]
+        timings = {}
+        started = time.perf_counter()
+        for key in keys:
+            cache.set(key, value)
+        timings['set'] = time.perf_counter() - started
+        started = time.perf_counter()
+        for key in keys:
+            cache.get(key)
+        timings['get'] = time.perf_counter() - started
+        started = time.perf_counter()
+        for start in range(0, BENCHMARK_OPS, 20):
+            cache.get_many(keys[start:start + 20])
+        timings['get_many'] = time.perf_counter() - started
+        cache.set('counter', 0)
+        started = time.perf_counter()
+        for _ in keys:
+            cache.incr('counter')
+        timings['incr'] = time.perf_counter() - started
+        return timings
+
+    def test_benchmark(self):
+        for name, backend in self.caches.items():
+            timings = self.measure(backend)
+            print(f'\n{name}: ' + ', '.join(
+                f'{op} {BENCHMARK_OPS / spent:.0f}/s'
+                for op, spent in timings.items()
+            ))
+            self.assertEqual(backend.get('counter'), BENCHMARK_OPS)
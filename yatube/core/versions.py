@@ -0,0 +1,67 @@
+import time
+from functools import partial
+
+from django.db import transaction
+
+
+def _initial_value():
+    # Счётчик после вытеснения не должен совпасть со старыми
+    # значениями, поэтому начинаем с текущего времени.
+    return int(time.time() * 1000)
+
+
+def read_counters(cache, keys):
+    """Значения счётчиков версий; вытесненные заводятся заново."""
+    values = cache.get_many(keys)
+    for key in set(keys) - values.keys():
+        cache.add(key, _initial_value(), None)
+        values[key] = cache.get(key)
+    return values
+
+
+def read_counter(cache, key):
+    return read_counters(cache, [key])[key]
+
+
+def bump_counter(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_value(), None)
+
+
+class CommitBatch:
+    """Отметки транзакции, которые обрабатываются разом после коммита.
+
+    Отметки хранятся в атрибуте соединения name. on_commit
+    регистрируется на каждую отметку: откат точки сохранения
+    отбрасывает свои on_commit, а остальные от этого не теряются.
+    Первый вызов передаёт все отметки в flush, следующие ничего
+    не делают.
+    """
+
+    def __init__(self, name, flush):
+        self.name = name
+        self.flush = flush
+
+    def pending(self, connection):
+        # После отката on_commit не вызывается: вне транзакции метки
+        # незавершённых записей больше не нужны.
+        if (
+            not connection.in_atomic_block
+            or not hasattr(connection, self.name)
+        ):
+            setattr(connection, self.name, set())
+        return getattr(connection, self.name)
+
+    def add(self, connection, item):
+        self.pending(connection).add(item)
+        transaction.on_commit(
+            partial(self._committed, connection), using=connection.alias
+        )
+
+    def _committed(self, connection):
+        items = getattr(connection, self.name, None)
+        if items:
+            setattr(connection, self.name, set())
+            self.flush(items)
@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import querycache
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +21,16 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def cache_stats(request):
+    """Счётчики кэшей по префиксам ключей в процессе, ответившем на
+    запрос; у каждого воркера они свои."""
+    data = {
+        alias: caches[alias].stats.snapshot()
+        for alias in settings.CACHES
+        if hasattr(caches[alias], 'stats')
+    }
+    data['queries'] = querycache.stats.snapshot()
+    return JsonResponse(data)
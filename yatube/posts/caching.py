@@ -0,0 +1,127 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.holes import fill_holes, punch_holes
+from core.singleflight import get_or_compute
+from core.versions import CommitBatch, bump_counter, read_counter
+
+FEED_GENERATION_KEY = 'posts:feed:generation'
+FEED_CHANGED_KEY = 'posts:feed:changed'
+COMMENTS_CHANGED_KEY = 'posts:comments:{post_id}:changed'
+USER_CHANGED_KEY = 'posts:user:{user_id}:changed'
+PAGE_KEY = 'posts:page:{versions}:{digest}'
+
+
+def feed_generation():
+    """Текущее поколение лент: входит в ключи закэшированных страниц."""
+    return read_counter(cache, FEED_GENERATION_KEY)
+
+
+def bump_feed_generation():
+    bump_counter(cache, FEED_GENERATION_KEY)
+    mark_changed(FEED_CHANGED_KEY)
+
+
+def mark_changed(key):
+    cache.set(key, time.time(), None)
+
+
+def changed_at(key):
+    """Время последнего изменения, записанное mark_changed.
+
+    Если отметка вытеснена из кэша, считаем, что изменение было
+    сейчас: клиент один раз получит страницу целиком.
+    """
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time(), None)
+        stamp = cache.get(key)
+    return stamp
+
+
+def comments_changed_key(post_id):
+    return COMMENTS_CHANGED_KEY.format(post_id=post_id)
+
+
+def invalidate_comments(post_id):
+    transaction.on_commit(
+        lambda: mark_changed(comments_changed_key(post_id))
+    )
+
+
+def user_changed_key(user_id):
+    return USER_CHANGED_KEY.format(user_id=user_id)
+
+
+def invalidate_user(user_id):
+    """Отмечает изменение профиля, которое не касается лент."""
+    transaction.on_commit(lambda: mark_changed(user_changed_key(user_id)))
+
+
+# Отметка о записях в ленты в незавершённой транзакции соединения.
+feeds_changed = CommitBatch(
+    'feeds_changed', lambda changed: bump_feed_generation()
+)
+
+
+def invalidate_feeds():
+    """Откладывает смену поколения до коммита транзакции.
+
+    Сколько бы записей ни было в транзакции, поколение сменится
+    один раз.
+    """
+    feeds_changed.add(transaction.get_connection(), FEED_GENERATION_KEY)
+
+
+def request_versions(request, versions, *args, **kwargs):
+    """versions(request, ...) вычисляется один раз на запрос."""
+    if not hasattr(request, '_versions'):
+        request._versions = {}
+    if versions not in request._versions:
+        request._versions[versions] = versions(request, *args, **kwargs)
+    return request._versions[versions]
+
+
+def page_key(request, tags):
+    digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return PAGE_KEY.format(
+        versions='-'.join(str(tag) for tag in tags), digest=digest
+    )
+
+
+def _cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def cache_feed(versions):
+    """Кэш страницы с ключом из её версий (см. conditional) и адреса.
+
+    Тело страницы кэшируется одно на всех: личные части ({% hole %})
+    в кэш попадают метками и заполняются для каждого запроса. Истёкшую
+    страницу пересчитывает один запрос, остальные получают старую.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            tags, _ = request_versions(request, versions, *args, **kwargs)
+            punch_holes(request)
+            response = get_or_compute(
+                page_key(request, tags),
+                lambda: view(request, *args, **kwargs),
+                settings.FEED_CACHE_TIMEOUT,
+                cacheable=_cacheable,
+            )
+            return fill_holes(request, response)
+        return wrapper
+    return decorator
@@ -0,0 +1,49 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.singleflight import jittered
+from .thumbnails import track_pending
+
+TEMPLATE = 'posts/includes/card_post.html'
+
+
+def card_key(post, hide_group):
+    """Ключ карточки меняется вместе со всем, что в ней показано."""
+    author = post.author
+    group = post.group
+    fingerprint = hashlib.md5('\x1f'.join(map(str, (
+        post.text, post.pub_date.isoformat(), post.image.name,
+        author.username, author.first_name, author.last_name,
+        group.slug if group else '', group.title if group else '',
+        hide_group,
+    ))).encode()).hexdigest()
+    return f'posts:card:{post.pk}:{fingerprint}'
+
+
+def attach_cards(page, hide_group=False):
+    """Кладёт в post.card готовую карточку для каждого поста страницы.
+
+    Карточки берутся из кэша одним get_many, рендерятся только промахи.
+    """
+    page.object_list = list(page.object_list)
+    keys = {post.pk: card_key(post, hide_group) for post in page.object_list}
+    cards = cache.get_many(keys.values())
+    missing = {}
+    for post in page.object_list:
+        key = keys[post.pk]
+        if key not in cards:
+            with track_pending() as thumbnail:
+                cards[key] = render_to_string(
+                    TEMPLATE, {'post': post, 'hide_group': hide_group}
+                )
+            # Карточку с исходной картинкой вместо миниатюры не кэшируем.
+            if not thumbnail.pending:
+                missing[key] = cards[key]
+        post.card = mark_safe(cards[key])
+    if missing:
+        cache.set_many(missing, jittered(settings.CARD_CACHE_TIMEOUT))
+    return page
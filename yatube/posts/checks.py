@@ -0,0 +1,22 @@
+import sqlite3
+
+from django.core.checks import Error, Tags, register
+from django.db import connection
+
+# follows.py пишет подписки одним запросом с ON CONFLICT и RETURNING.
+MIN_SQLITE_VERSION = (3, 35)
+
+
+@register(Tags.compatibility)
+def check_sqlite_version(app_configs, **kwargs):
+    """Проверяет, что SQLite поддерживает RETURNING."""
+    if connection.vendor != 'sqlite':
+        return []
+    if sqlite3.sqlite_version_info >= MIN_SQLITE_VERSION:
+        return []
+    return [Error(
+        f'Нужен SQLite 3.35 или новее, установлен {sqlite3.sqlite_version}.',
+        hint='Подписки пишутся запросами INSERT ... ON CONFLICT DO NOTHING '
+             'RETURNING и DELETE ... RETURNING.',
+        id='posts.E001',
+    )]
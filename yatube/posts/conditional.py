@@ -0,0 +1,118 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from core.querycache import cached
+from .caching import (
+    FEED_CHANGED_KEY, changed_at, comments_changed_key, feed_generation,
+    request_versions, user_changed_key
+)
+from .models import User
+
+
+class Validators:
+    """ETag и Last-Modified из функции versions.
+
+    versions(request, *args, **kwargs) возвращает версии для ETag и
+    метки времени изменений для Last-Modified; она вызывается один раз
+    на запрос. Для страниц, которые не зависят от пользователя
+    (per_user=False), сессия не читается. Страницы с формами (csrf=True)
+    сверяются и по cookie CSRF: вход меняет токен, и закэшированная
+    браузером форма с прежним токеном не прошла бы проверку.
+    """
+
+    def __init__(self, versions, per_user, csrf=False):
+        self.versions = versions
+        self.per_user = per_user
+        self.csrf = csrf
+
+    def etag(self, request, *args, **kwargs):
+        tags, _ = request_versions(request, self.versions, *args, **kwargs)
+        if self.per_user:
+            # Шапка и кнопки страницы зависят от пользователя.
+            tags = (request.user.pk or 0, *tags)
+        if self.csrf:
+            tags = (*tags, csrf_version(request))
+        return '-'.join(str(tag) for tag in tags)
+
+    def last_modified(self, request, *args, **kwargs):
+        # Вход и выход не меняют дату, поэтому авторизованным хватает ETag.
+        if self.per_user and request.user.is_authenticated:
+            return None
+        _, stamps = request_versions(request, self.versions, *args, **kwargs)
+        return datetime.fromtimestamp(max(stamps), timezone.utc)
+
+
+def csrf_version(request):
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return hashlib.md5(token.encode()).hexdigest()[:12]
+
+
+def conditional(versions, per_user=True, csrf=False):
+    """Условный GET: при совпадении валидаторов с заголовками запроса
+    клиент получает 304, а представление не вызывается."""
+    validators = Validators(versions, per_user, csrf)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=validators.etag,
+            last_modified_func=validators.last_modified,
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            modified = validators.last_modified(request, *args, **kwargs)
+            if modified and response.status_code == 200:
+                # Syndication ставит свою дату, а сверять будут с нашей.
+                response['Last-Modified'] = http_date(modified.timestamp())
+            # Браузер хранит страницу, но перед показом сверяет её.
+            if response.has_header('Expires'):
+                del response['Expires']
+            patch_cache_control(
+                response,
+                no_cache=True,
+                max_age=0,
+                **{'private' if per_user else 'public': True},
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+def feed_versions(request, *args, **kwargs):
+    return (feed_generation(),), (changed_at(FEED_CHANGED_KEY),)
+
+
+def profile_versions(request, username):
+    # Счётчики и кнопка подписки меняются без смены поколения лент.
+    author_id = cached(
+        User.objects.filter(username=username), 'user_pk'
+    ).values_list('pk', flat=True).first()
+    user_changed = changed_at(user_changed_key(author_id))
+    return (
+        (feed_generation(), author_id, user_changed),
+        (changed_at(FEED_CHANGED_KEY), user_changed),
+    )
+
+
+def post_versions(request, post_id):
+    comments_changed = changed_at(comments_changed_key(post_id))
+    return (
+        (feed_generation(), comments_changed),
+        (changed_at(FEED_CHANGED_KEY), comments_changed),
+    )
+
+
+def follow_versions(request, *args, **kwargs):
+    # Подписка и отписка меняют ленту без смены поколения лент.
+    user_changed = changed_at(user_changed_key(request.user.pk))
+    return (
+        (feed_generation(), user_changed),
+        (changed_at(FEED_CHANGED_KEY), user_changed),
+    )
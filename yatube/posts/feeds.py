@@ -0,0 +1,59 @@
+from django.conf import settings
+
+from core.querycache import cached
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+
+# Запросы лент общие для HTML-страниц и API: одинаковые запросы
+# попадают в одни и те же индексы и ключи кэша.
+
+# Лента подписок идёт по дате своей записи, а не по дате поста.
+FOLLOWED_FIELD = 'timeline_entries__pub_date'
+# Поля пользователя, которые показывают страницы и API. Пароль, почта
+# и остальное не читаются и не попадают в кэш запросов.
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+HIDDEN_AUTHOR_FIELDS = tuple(
+    f'author__{field.name}' for field in User._meta.concrete_fields
+    if field.name not in USER_FIELDS
+)
+
+
+def with_authors(posts):
+    return posts.select_related('author', 'group').defer(
+        *HIDDEN_AUTHOR_FIELDS
+    )
+
+
+def all_posts():
+    return cached(with_authors(Post.objects), 'all_posts')
+
+
+def group_posts(group):
+    return cached(with_authors(group.posts), 'group_posts')
+
+
+def author_posts(author):
+    return cached(with_authors(author.posts), 'author_posts')
+
+
+def groups():
+    return cached(Group.objects, 'groups')
+
+
+def users():
+    return cached(User.objects.only(*USER_FIELDS), 'users')
+
+
+def followed_posts(user):
+    # Порядок по дате записи ленты берётся прямо из её индекса.
+    return with_authors(
+        Post.objects.filter(timeline_entries__user=user)
+    ).order_by(f'-{FOLLOWED_FIELD}')
+
+
+def comments_page(post, cursor):
+    return CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        field='created',
+    ).get_page(cursor)
@@ -0,0 +1,82 @@
+"""Подписки пишутся сырым SQL, по одному запросу на пачку авторов.
+
+INSERT ... ON CONFLICT DO NOTHING RETURNING и DELETE ... RETURNING
+требуют SQLite 3.35 или новее, версию проверяет posts.checks. Сырой
+SQL не создаёт экземпляров Follow, поэтому сигналы post_save и
+post_delete для них не срабатывают: ленту и счётчики обновляют
+followed и unfollowed, которые здесь вызываются явно.
+"""
+from django.db import connection, transaction
+
+from . import caching, stats, timeline
+
+
+def followed(user_id, author_id):
+    """Обновляет ленту и счётчики после новой подписки."""
+    timeline.backfill(user_id, author_id)
+    stats.change(user_id, following_count=1)
+    stats.change(author_id, followers_count=1)
+    caching.invalidate_user(user_id)
+    caching.invalidate_user(author_id)
+
+
+def unfollowed(user_id, author_id):
+    """Обновляет ленту и счётчики после отписки."""
+    timeline.trim(user_id, author_id)
+    stats.change(user_id, following_count=-1)
+    stats.change(author_id, followers_count=-1)
+    caching.invalidate_user(user_id)
+    caching.invalidate_user(author_id)
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def follow(user, usernames):
+    """Подписывает пользователя на авторов одним INSERT.
+
+    Существующие подписки и подписка на себя пропускаются уникальным
+    индексом и условием запроса, поэтому повторный запрос ничего не
+    меняет. Сигналы Follow не срабатывают, вместо них вызывается
+    followed. Возвращает id авторов, подписка на которых появилась.
+    """
+    if not usernames:
+        return []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO posts_follow (user_id, author_id) '
+                'SELECT %s, id FROM auth_user '
+                f'WHERE username IN ({_placeholders(usernames)}) '
+                'AND id <> %s '
+                'ON CONFLICT DO NOTHING RETURNING author_id',
+                [user.pk, *usernames, user.pk],
+            )
+            author_ids = [row[0] for row in cursor.fetchall()]
+        for author_id in author_ids:
+            followed(user.pk, author_id)
+    return author_ids
+
+
+def unfollow(user, usernames):
+    """Отписывает пользователя от авторов одним DELETE.
+
+    Сигналы Follow не срабатывают, вместо них вызывается unfollowed.
+    Возвращает id авторов, подписка на которых действительно была.
+    """
+    if not usernames:
+        return []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM posts_follow WHERE user_id = %s '
+                'AND author_id IN (SELECT id FROM auth_user '
+                f'WHERE username IN ({_placeholders(usernames)})) '
+                'RETURNING author_id',
+                [user.pk, *usernames],
+            )
+            author_ids = [row[0] for row in cursor.fetchall()]
+        for author_id in author_ids:
+            unfollowed(user.pk, author_id)
+    return author_ids
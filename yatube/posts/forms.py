@@ -1,6 +1,11 @@
+import re
+
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
-from .models import Post, Comment
+from .images import normalize_image
+from .models import Comment, Group, Post, User
 
 
 class PostForm(forms.ModelForm):
@@ -8,8 +13,55 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image, self.image_bytes_saved = normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Найти', max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        label='Группа',
+        empty_label='Все группы',
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise forms.ValidationError('Такого автора нет.')
+
+
+class BulkFollowForm(forms.Form):
+    action = forms.ChoiceField(
+        choices=(('follow', 'Подписаться'), ('unfollow', 'Отписаться'))
+    )
+    usernames = forms.CharField(
+        label='Пользователи', help_text='Имена через пробел или запятую.'
+    )
+
+    def clean_usernames(self):
+        usernames = list(dict.fromkeys(
+            re.split(r'[\s,]+', self.cleaned_data['usernames'].strip())
+        ))
+        limit = settings.FOLLOW_BULK_MAX_USERNAMES
+        if len(usernames) > limit:
+            raise forms.ValidationError(
+                f'Не больше {limit} пользователей за раз.'
+            )
+        return usernames
@@ -0,0 +1,93 @@
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'
+}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _target_format(image):
+    if settings.UPLOAD_IMAGE_FORMAT == 'WEBP':
+        return 'WEBP'
+    return 'PNG' if _has_alpha(image) else 'JPEG'
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image_format != 'JPEG' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    buffer = io.BytesIO()
+    options = {'optimize': True}
+    if image_format in ('JPEG', 'WEBP'):
+        options['quality'] = settings.UPLOAD_IMAGE_QUALITY
+    if image_format == 'JPEG':
+        options['progressive'] = True
+    # Метаданные (EXIF, комментарии) при сохранении не передаются.
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def normalize_image(upload):
+    """Уменьшает, очищает от EXIF и перекодирует загруженную картинку.
+
+    Возвращает файл для сохранения и число сэкономленных байт. Если
+    перекодирование не уменьшает файл и ничего не нужно вырезать,
+    возвращается исходный файл.
+    """
+    try:
+        return _normalize(upload)
+    except (OSError, ValueError):
+        # Проверка формы читает только заголовок: обрезанный или битый
+        # файл обнаруживается, когда пиксели распаковываются здесь.
+        raise ValidationError('Файл изображения повреждён.')
+
+
+def _normalize(upload):
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Изображение слишком большое.')
+    width, height = image.size
+    # Размеры известны из заголовка, пиксели ещё не распакованы.
+    if width * height > settings.UPLOAD_IMAGE_MAX_PIXELS:
+        raise ValidationError('Изображение слишком большое.')
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload, 0
+    has_exif = bool(image.getexif())
+    max_side = settings.UPLOAD_IMAGE_MAX_SIDE
+    oversized = max(width, height) > max_side
+    image = ImageOps.exif_transpose(image)
+    if oversized:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image_format = _target_format(image)
+    content = _encode(image, image_format)
+    if not (oversized or has_exif) and len(content) >= upload.size:
+        upload.seek(0)
+        return upload, 0
+    saved = upload.size - len(content)
+    name = f'{os.path.splitext(upload.name)[0]}.{EXTENSIONS[image_format]}'
+    logger.info(
+        'Картинка %s: %d -> %d байт, сэкономлено %d',
+        name, upload.size, len(content), saved,
+    )
+    return SimpleUploadedFile(
+        name, content, content_type=CONTENT_TYPES[image_format]
+    ), saved
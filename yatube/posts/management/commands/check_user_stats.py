@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики профилей с базой и пересчитывает разошедшиеся.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько пользователей проверять за один проход.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        drifted = stats.check(
+            chunk_size=options['chunk_size'], fix=not options['dry_run']
+        )
+        self.stdout.write(
+            f'Счётчики разошлись у пользователей: {drifted}'
+        )
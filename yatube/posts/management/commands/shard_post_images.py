@@ -0,0 +1,74 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import caching, media
+from posts.models import Post, StoredFile
+from posts.storage import post_image_storage
+
+SHARDED_PATTERN = r'^{}[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в каталоги по хэшу содержимого и '
+        'переписывает поле image. Прерванный перенос можно запустить '
+        'снова: уже разложенные картинки пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов обрабатывать за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        legacy = Post.objects.exclude(image='').exclude(
+            image__regex=SHARDED_PATTERN.format(settings.UPLOAD_TO)
+        ).order_by('pk')
+        moved = 0
+        last_pk = 0
+        while True:
+            batch = list(legacy.filter(pk__gt=last_pk).values_list(
+                'pk', 'image'
+            )[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for name in dict.fromkeys(image for _, image in batch):
+                moved += self.move(name)
+        if moved:
+            caching.bump_feed_generation()
+        self.stdout.write(f'Перенесено постов: {moved}')
+
+    def move(self, old_name):
+        try:
+            with post_image_storage.open(old_name) as content:
+                new_name = post_image_storage.save(
+                    os.path.join(
+                        settings.UPLOAD_TO, os.path.basename(old_name)
+                    ),
+                    content,
+                )
+        except (OSError, SuspiciousFileOperation) as error:
+            self.stderr.write(f'Пропускаем {old_name}: {error}')
+            return 0
+        with transaction.atomic():
+            moved = Post.objects.filter(image=old_name).update(image=new_name)
+            StoredFile.objects.filter(name=old_name).delete()
+            StoredFile.objects.update_or_create(
+                name=new_name,
+                defaults={
+                    'references': Post.objects.filter(image=new_name).count()
+                },
+            )
+        # Ссылка, взятая хранилищем, уже учтена в подсчёте выше.
+        media.forget_claims()
+        default.kvstore.delete(ImageFile(old_name, post_image_storage))
+        post_image_storage.delete(old_name)
+        return moved
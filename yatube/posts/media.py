@@ -0,0 +1,92 @@
+import logging
+import threading
+from collections import Counter
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import StoredFile
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+# Ссылки, которые хранилище взяло при сохранении файла, а пост ещё не
+# засчитал: сигнал сохранения поста выполняется в том же потоке.
+_claims = threading.local()
+
+
+def _pending():
+    if not hasattr(_claims, 'names'):
+        _claims.names = Counter()
+    return _claims.names
+
+
+def _increment(name):
+    # UPDATE без предварительного чтения атомарен; строку создаём,
+    # только если её ещё нет.
+    counted = StoredFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    )
+    if counted:
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+
+
+def claim(name):
+    """Ссылка, которую берёт хранилище до проверки, есть ли файл.
+
+    Её засчитывает следующий acquire(name) в этом потоке.
+    """
+    _increment(name)
+    _pending()[name] += 1
+
+
+def forget_claims():
+    """Сбрасывает ссылки хранилища, которые не засчитает ни один пост."""
+    _pending().clear()
+
+
+def acquire(name):
+    """Отмечает, что ещё один пост ссылается на файл."""
+    pending = _pending()
+    if pending[name]:
+        pending[name] -= 1
+        return
+    _increment(name)
+
+
+def release(name):
+    """Снимает ссылку; файл без ссылок удаляется после коммита.
+
+    Файлы, про которые нет записи в StoredFile (загруженные до подсчёта
+    ссылок), не удаляются никогда.
+    """
+    StoredFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1
+    )
+    transaction.on_commit(lambda: _delete_unreferenced(name))
+
+
+def _delete_unreferenced(name):
+    # DELETE с условием references=0 блокирует строку до конца
+    # транзакции, и файл удаляется раньше, чем claim сможет её взять.
+    with transaction.atomic():
+        deleted, _ = StoredFile.objects.filter(
+            name=name, references=0
+        ).delete()
+        if not deleted:
+            return
+        try:
+            default.kvstore.delete(ImageFile(name, post_image_storage))
+            post_image_storage.delete(name)
+        except (OSError, SuspiciousFileOperation) as error:
+            logger.warning('Не удалось удалить файл %s: %s', name, error)
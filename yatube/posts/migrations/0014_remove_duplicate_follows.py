@@ -0,0 +1,54 @@
+from django.db import migrations, transaction
+from django.db.models import Count, Min
+
+BATCH_SIZE = 1000
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставляет по одной подписке на пару (читатель, автор).
+
+    Дубли удаляются пачками в отдельных транзакциях, чтобы не держать
+    блокировку всей таблицы. Счётчики профилей затронутых
+    пользователей пересчитываются по оставшимся подпискам.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    while True:
+        duplicates = list(
+            Follow.objects.values('user_id', 'author_id').annotate(
+                keep=Min('id'), total=Count('id')
+            ).filter(total__gt=1).order_by()[:BATCH_SIZE]
+        )
+        if not duplicates:
+            return
+        with transaction.atomic():
+            for row in duplicates:
+                Follow.objects.filter(
+                    user_id=row['user_id'], author_id=row['author_id']
+                ).exclude(pk=row['keep']).delete()
+            for user_id in {row['user_id'] for row in duplicates}:
+                UserStats.objects.filter(user_id=user_id).update(
+                    following_count=Follow.objects.filter(
+                        user_id=user_id
+                    ).count()
+                )
+            for author_id in {row['author_id'] for row in duplicates}:
+                UserStats.objects.filter(user_id=author_id).update(
+                    followers_count=Follow.objects.filter(
+                        author_id=author_id
+                    ).count()
+                )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0013_post_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.db import models
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -40,6 +42,7 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to=settings.UPLOAD_TO,
+        storage=post_image_storage,
         blank=True
     )
 
@@ -48,6 +51,18 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-pub_date',)
+        # SQLite читает индекс в обе стороны, а в конец индекса неявно
+        # входит id: возрастающий индекс по дате отдаёт ленту в порядке
+        # (-pub_date, -id) без сортировки.
+        indexes = (
+            models.Index(fields=('pub_date',), name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', 'pub_date'), name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', 'pub_date'), name='post_group_pub_date_idx'
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -76,6 +91,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created_idx'
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -95,9 +115,126 @@ class Follow(models.Model):
     )
 
     class Meta:
-        models.UniqueConstraint(
-            fields=['user', 'author'],
-            name='following_unique'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='following_unique'
+            ),
         )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя, разложенный при публикации."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата_публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='timeline_entry_unique'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class UserStats(models.Model):
+    """Счётчики профиля, которые обновляются вместе с постами и подписками."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class StoredFile(models.Model):
+    """Сколько постов ссылается на файл в хранилище картинок."""
+
+    name = models.CharField(
+        max_length=255, unique=True, verbose_name='Имя файла'
+    )
+    references = models.PositiveIntegerField(
+        default=0, verbose_name='Ссылок'
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class FullTextField(models.TextField):
+    """Колонка таблицы FTS5: поддерживает поиск поле__match=запрос."""
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostSearchIndex(models.Model):
+    """Строка полнотекстового индекса постов (миграция 0013).
+
+    Таблицу создаёт и поддерживает SQL миграции, модель только даёт
+    присоединить её к Post в запросах. rank — bm25 совпадения, он
+    определён лишь в запросе с match.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+    )
+    text = FullTextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
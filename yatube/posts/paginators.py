@@ -0,0 +1,278 @@
+import base64
+import binascii
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core.cache import shared_cache
+from core.singleflight import jittered
+from core.tasks import run_in_background
+
+OLDER = 'o'
+NEWER = 'n'
+ELLIPSIS = None
+
+
+def encode_cursor(direction, value, pk):
+    raw = f'{direction}|{value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse_value=parse_datetime):
+    """Разбирает курсор; для битого курсора возвращает None.
+
+    parse_value превращает строку ключа обратно в значение поля.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split('|')
+        value = parse_value(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (OLDER, NEWER) or value is None:
+        return None
+    return direction, value, pk
+
+
+def page_window(page, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей; пропуски обозначены ELLIPSIS.
+
+    Длина списка не зависит от числа страниц в ленте.
+    """
+    number = page.number
+    num_pages = page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    window = []
+    if number > on_each_side + on_ends + 1:
+        window.extend(range(1, on_ends + 1))
+        window.append(ELLIPSIS)
+        window.extend(range(number - on_each_side, number + 1))
+    else:
+        window.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends:
+        window.extend(range(number + 1, number + on_each_side + 1))
+        window.append(ELLIPSIS)
+        window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        window.extend(range(number + 1, num_pages + 1))
+    return window
+
+
+class CursorPage:
+    """Страница, выбранная по ключу (значение поля, id) без OFFSET."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous, field):
+        self.object_list = object_list
+        self.field = field
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self._cursor(OLDER, self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self._cursor(NEWER, self.object_list[0])
+        return None
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(direction, getattr(obj, self.field), obj.pk)
+
+
+class CursorPaginator:
+    """Пагинатор по курсору вместо номера страницы.
+
+    Каждая страница — это поиск по индексу от последнего показанного
+    объекта, поэтому её стоимость не зависит от глубины списка.
+    По умолчанию объекты идут от новых к старым по полю даты field;
+    descending=False и parse_value задают другой порядок и ключ
+    (например, ранг поиска). OLDER в курсоре ведёт к следующей
+    странице, NEWER — к предыдущей. Поле связанной модели
+    (timeline_entries__pub_date) выбирается из соединения, по которому
+    уже отфильтрован запрос: отдельный filter() по нему добавил бы
+    второе соединение.
+    """
+
+    page_class = CursorPage
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 descending=True, parse_value=parse_datetime):
+        if LOOKUP_SEP in field:
+            object_list = object_list.annotate(cursor_date=F(field))
+            field = 'cursor_date'
+        self.object_list = object_list
+        self.per_page = per_page
+        self.field = field
+        self.descending = descending
+        self.parse_value = parse_value
+
+    def get_page(self, cursor):
+        decoded = (
+            decode_cursor(cursor, self.parse_value) if cursor else None
+        )
+        if decoded is None:
+            objects = self._slice(self.object_list.order_by(*self._order()))
+            return self._page(objects, len(objects) > self.per_page, False)
+        direction, value, pk = decoded
+        if direction == OLDER:
+            objects = self._slice(
+                self._after(value, pk).order_by(*self._order())
+            )
+            return self._page(objects, len(objects) > self.per_page, True)
+        objects = self._slice(self._after(value, pk, backwards=True)
+                              .order_by(*self._order(backwards=True)))
+        page = objects[:self.per_page][::-1]
+        # Курсор мог быть подделан: дальше страницы может не оказаться
+        # ничего, а сама страница может быть пустой.
+        has_next = bool(page) and self._after(
+            getattr(page[-1], self.field), page[-1].pk
+        ).exists()
+        return self._page(page, has_next, len(objects) > self.per_page)
+
+    def _order(self, backwards=False):
+        sign = '-' if self.descending != backwards else ''
+        return f'{sign}{self.field}', f'{sign}pk'
+
+    def _after(self, value, pk, backwards=False):
+        """Объекты, идущие в порядке вывода после ключа (value, pk)."""
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        field = self.field
+        return self.object_list.filter(
+            Q(**{f'{field}__{lookup}': value})
+            | Q(**{field: value, f'pk__{lookup}': pk})
+        )
+
+    def _slice(self, queryset):
+        return list(queryset[:self.per_page + 1])
+
+    def _page(self, objects, has_next, has_previous):
+        return self.page_class(
+            objects[:self.per_page], has_next, has_previous, self.field
+        )
+
+
+def _count_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    return f'posts:count:{digest}'
+
+
+def refresh_count(queryset, key=None):
+    key = key or _count_key(queryset)
+    total = queryset.count()
+    cache.set(key, {
+        'total': total,
+        'fresh_until': time.time() + jittered(settings.FEED_COUNT_TIMEOUT),
+    }, None)
+    shared_cache().delete(f'{key}:refresh')
+    return total
+
+
+class CountFreePage(Page):
+    """Страница, для которой наличие следующей известно без COUNT(*)."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountFreePaginator(Paginator):
+    """Paginator, который не выполняет COUNT(*) на каждый запрос.
+
+    Для has_next страница читается с одной лишней строкой. Общее число
+    постов нужно только для ссылки на последнюю страницу: оно берётся
+    из кэша и пересчитывается в фоне, когда устаревает. Пока его нет,
+    используется оценка снизу по уже прочитанным строкам.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._seen = 0
+
+    @cached_property
+    def count(self):
+        key = _count_key(self.object_list)
+        cached = cache.get(key)
+        if cached is None or cached['fresh_until'] < time.time():
+            if shared_cache().add(
+                f'{key}:refresh', 1, settings.FEED_COUNT_TIMEOUT
+            ):
+                run_in_background(refresh_count, self.object_list, key)
+        total = cached['total'] if cached else 0
+        return max(total, self._seen)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        return max(number, 1)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('Страница не содержит результатов')
+        has_next = len(rows) > self.per_page
+        self._seen = bottom + len(rows)
+        return CountFreePage(rows[:self.per_page], number, self, has_next)
+
+    def get_page(self, number):
+        number = self.validate_number(number)
+        try:
+            return self.page(number)
+        except EmptyPage:
+            pass
+        # Номер за концом ленты ведёт на последнюю страницу. Если числа
+        # постов нет в кэше или по нему страница пуста, оно считается
+        # сразу: так бывает только на таких адресах.
+        key = _count_key(self.object_list)
+        if cache.get(key) is not None:
+            try:
+                return self.page(max(self.num_pages, 1))
+            except EmptyPage:
+                pass
+        self.__dict__['count'] = refresh_count(self.object_list, key)
+        self.__dict__.pop('num_pages', None)
+        return self.page(max(self.num_pages, 1))
@@ -0,0 +1,92 @@
+import re
+
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginators import CursorPage, CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+
+# Управляющие символы не встречаются в тексте постов и переживают
+# экранирование HTML, поэтому ими удобно размечать найденные слова.
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 24
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в запрос FTS5.
+
+    Синтаксис FTS5 пользователю не доступен: каждое слово ищется как
+    префикс, чтобы «пост» находил и «посты», все слова обязательны.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """Подзапрос с id постов, подходящих под запрос, без ранжирования."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match_expression(query),),
+    )
+
+
+def search_posts(query, group=None, author=None):
+    """Посты, подходящие под запрос, с рангом и фрагментом текста.
+
+    Ранг — значение bm25: чем меньше, тем лучше совпадение.
+    """
+    expression = match_expression(query)
+    # snippet() ссылается на таблицу индекса, присоединённую через
+    # search_index под своим именем.
+    posts = Post.objects.select_related('author', 'group').filter(
+        search_index__text__match=expression
+    ).annotate(
+        search_rank=F('search_index__rank'),
+        search_snippet=RawSQL(
+            f"snippet({FTS_TABLE}, 0, %s, %s, '…', {SNIPPET_TOKENS})",
+            (MARK_START, MARK_END),
+        ),
+    )
+    if not expression:
+        # Запрос без единого слова: пустой набор сохраняет аннотации,
+        # по которым сортирует SearchPaginator.
+        return posts.none()
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    return posts
+
+
+class SearchPage(CursorPage):
+    def __init__(self, object_list, has_next, has_previous, field):
+        super().__init__(object_list, has_next, has_previous, field)
+        for post in object_list:
+            post.snippet = highlight(post.search_snippet)
+
+
+class SearchPaginator(CursorPaginator):
+    """Постраничный вывод результатов поиска по ключу (ранг, id).
+
+    Лучшие совпадения, с меньшим рангом, идут первыми.
+    """
+
+    page_class = SearchPage
+
+    def __init__(self, posts, per_page):
+        super().__init__(
+            posts, per_page, field='search_rank', descending=False,
+            parse_value=float,
+        )
@@ -0,0 +1,85 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import caching, follows, media, stats, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.push_post(instance)
+        stats.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, raw=False, **kwargs):
+    if instance.image and not raw:
+        thumbnails.schedule_thumbnails(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts_count=-1)
+    if image_name(instance):
+        media.release(image_name(instance))
+
+
+def image_name(post):
+    # Читаем из __dict__, чтобы не загружать отложенное поле.
+    value = post.__dict__.get('image')
+    return getattr(value, 'name', value) or None
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    instance._stored_image = image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, raw=False,
+                           update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    old = None if created else instance._stored_image
+    new = image_name(instance)
+    if old != new:
+        if new:
+            media.acquire(new)
+        if old:
+            media.release(old)
+    instance._stored_image = new
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follows.followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feeds(sender, **kwargs):
+    caching.invalidate_feeds()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comments_changed(sender, instance, **kwargs):
+    caching.invalidate_comments(instance.post_id)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login, ленты от этого
+    # не меняются.
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    caching.invalidate_feeds()
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Follow, Post, User, UserStats
+
+FIELDS = ('posts_count', 'following_count', 'followers_count')
+
+
+def count(user_ids):
+    """Считает счётчики по исходным таблицам для группы пользователей."""
+    counters = {user_id: dict.fromkeys(FIELDS, 0) for user_id in user_ids}
+    sources = (
+        ('posts_count', Post.objects, 'author_id'),
+        ('following_count', Follow.objects, 'user_id'),
+        ('followers_count', Follow.objects, 'author_id'),
+    )
+    for field, queryset, column in sources:
+        rows = queryset.filter(
+            **{f'{column}__in': user_ids}
+        ).order_by().values(column).annotate(total=Count('pk')).values_list(
+            column, 'total'
+        )
+        for user_id, total in rows:
+            counters[user_id][field] = total
+    return counters
+
+
+def change(user_id, **deltas):
+    """Атомарно сдвигает счётчики; строку без статистики не создаёт."""
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def for_user(user):
+    """Возвращает статистику, при первом обращении считает её по базе.
+
+    Строка создаётся до подсчёта и в той же транзакции: записи, которые
+    закоммитятся после, сдвинут её через change().
+    """
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        pass
+    with transaction.atomic():
+        stats, created = UserStats.objects.get_or_create(user=user)
+        if created:
+            for field, total in count([user.pk])[user.pk].items():
+                setattr(stats, field, total)
+            stats.save(update_fields=FIELDS)
+    return stats
+
+
+def check(chunk_size=1000, fix=True):
+    """Сверяет счётчики с базой по частям и чинит разошедшиеся.
+
+    Возвращает число пользователей, у которых счётчики разошлись.
+    """
+    drifted = 0
+    last_pk = 0
+    while True:
+        user_ids = list(User.objects.filter(
+            pk__gt=last_pk
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not user_ids:
+            return drifted
+        last_pk = user_ids[-1]
+        actual = count(user_ids)
+        stored = {
+            stats.user_id: stats
+            for stats in UserStats.objects.filter(user_id__in=user_ids)
+        }
+        stale = []
+        for user_id, counters in actual.items():
+            stats = stored.get(user_id)
+            if stats is None or any(
+                getattr(stats, field) != counters[field] for field in FIELDS
+            ):
+                stale.append(UserStats(user_id=user_id, **counters))
+        drifted += len(stale)
+        if fix and stale:
+            with transaction.atomic():
+                UserStats.objects.filter(
+                    user_id__in=[stats.user_id for stats in stale]
+                ).delete()
+                UserStats.objects.bulk_create(stale)
@@ -0,0 +1,61 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+def sharded_name(directory, digest, extension):
+    """Раскладывает файлы по двум уровням каталогов по началу хэша.
+
+    Так в одном каталоге не оказывается миллион файлов.
+    """
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension}'
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по хэшу их содержимого.
+
+    Повторная загрузка той же картинки не создаёт новый файл, а
+    возвращает имя уже сохранённого вместе с его миниатюрами. Файлы
+    лежат в каталогах вида posts/ab/cd/abcd….jpg.
+
+    Ссылка на файл (media.claim) берётся в одной транзакции с проверкой,
+    есть ли он: файл без ссылок удаляется тоже в транзакции, так что
+    сохранение либо увидит ссылку удаления раньше, либо не найдёт файл
+    и запишет его заново.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return sharded_name(
+            os.path.dirname(name),
+            digest.hexdigest(),
+            os.path.splitext(name)[1].lower(),
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        # media импортирует модели, а модели — это хранилище.
+        from .media import claim
+        with transaction.atomic():
+            claim(name)
+            if self.exists(name):
+                return name
+            return self._save(name, content)
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.template.defaultfilters import linebreaksbr, truncatechars
+from django.urls import reverse, reverse_lazy
+from django.utils.feedgenerator import Atom1Feed
+
+from . import feeds
+
+
+class LatestPostsFeed(Feed):
+    """Atom-лента всех постов; записи берутся теми же запросами, что и
+    HTML-ленты."""
+
+    feed_type = Atom1Feed
+    title = 'Yatube: последние записи'
+    link = reverse_lazy('posts:main_page')
+    subtitle = 'Новые посты всех авторов'
+
+    def items(self, obj=None):
+        return feeds.all_posts()[:settings.SYNDICATION_ITEMS]
+
+    def item_title(self, post):
+        return truncatechars(post.text, 60)
+
+    def item_description(self, post):
+        return linebreaksbr(post.text)
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=[post.pk])
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_author_link(self, post):
+        return reverse('posts:profile', args=[post.author.username])
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    subtitle = None
+
+    def get_object(self, request, slug):
+        return get_object_or_404(feeds.groups(), slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def link(self, group):
+        return reverse('posts:group_post', args=[group.slug])
+
+    def items(self, group):
+        return feeds.group_posts(group)[:settings.SYNDICATION_ITEMS]
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    subtitle = None
+
+    def get_object(self, request, username):
+        return get_object_or_404(feeds.users(), username=username)
+
+    def title(self, author):
+        return f'Yatube: записи {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+    def items(self, author):
+        return feeds.author_posts(author)[:settings.SYNDICATION_ITEMS]
@@ -0,0 +1,16 @@
+from django import template
+
+from core.querycache import cached
+from posts.models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, username):
+    """Подписан ли текущий пользователь на автора с этим именем."""
+    user = context['request'].user
+    return user.is_authenticated and cached(
+        Follow.objects.filter(user=user, author__username=username),
+        'following',
+    ).exists()
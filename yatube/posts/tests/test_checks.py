@@ -0,0 +1,15 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..checks import check_sqlite_version
+
+
+class SQLiteVersionCheckTests(SimpleTestCase):
+    def test_current_sqlite_passes(self):
+        self.assertEqual(check_sqlite_version(None), [])
+
+    @mock.patch('sqlite3.sqlite_version_info', (3, 34, 1))
+    def test_old_sqlite_fails(self):
+        errors = check_sqlite_version(None)
+        self.assertEqual([error.id for error in errors], ['posts.E001'])
@@ -1,14 +1,23 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 
+from .. import media
 from ..forms import PostForm
-from ..models import Comment, Group, Post, User
+from ..models import Comment, Group, Post, StoredFile, User
+from ..storage import post_image_storage
 from django import forms
+from PIL import Image
 
 
 USERNAME = 'auth'
@@ -36,9 +45,23 @@ SMALL_GIF_2 = (
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B'
 )
+SMALL_GIF_HASH = hashlib.sha256(SMALL_GIF).hexdigest()
+SMALL_GIF_NAME = (
+    f'{settings.UPLOAD_TO}{SMALL_GIF_HASH[:2]}/{SMALL_GIF_HASH[2:4]}/'
+    f'{SMALL_GIF_HASH}.gif'
+)
 TEXT_COMMENT = 'Ура, комментарий отправляется'
 
 
+def make_jpeg(size):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera maker'
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=100, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
     @classmethod
@@ -106,9 +129,7 @@ class PostFormTests(TestCase):
         self.assertEqual(new_post.text, form_data['text'])
         self.assertEqual(new_post.group.id, form_data['group'])
         self.assertEqual(new_post.author, PostFormTests.user)
-        self.assertEqual(
-            new_post.image, f'{settings.UPLOAD_TO}{form_data["image"]}'
-        )
+        self.assertEqual(new_post.image, SMALL_GIF_NAME)
 
     def test_post_edit(self):
         """При отправке валидной формы в базе данных меняется пост."""
@@ -131,10 +152,7 @@ class PostFormTests(TestCase):
         self.assertEqual(edited_post.text, form_data['text'])
         self.assertEqual(edited_post.author, PostFormTests.post.author)
         self.assertEqual(edited_post.group.id, form_data['group'])
-        self.assertEqual(
-            edited_post.image.name,
-            f'{settings.UPLOAD_TO}{form_data["image"].name}'
-        )
+        self.assertEqual(edited_post.image.name, SMALL_GIF_NAME)
 
     def test_create_page_shows_correct_context(self):
         """Шаблон post_create сформирован с правильным контекстом."""
@@ -216,3 +234,152 @@ class PostFormTests(TestCase):
                     PostFormTests.post.image,
                     edited_post.image
                 )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, UPLOAD_IMAGE_MAX_SIDE=100)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(PostImageUploadTests.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, content, name='photo.jpg'):
+        return PostImageUploadTests.authorized_client.post(
+            URL_POST_CREATE,
+            data={
+                'text': 'Пост с фотографией',
+                'image': SimpleUploadedFile(
+                    name=name, content=content, content_type='image/jpeg'
+                ),
+            },
+        )
+
+    def test_image_downscaled_and_stripped(self):
+        content = make_jpeg((400, 200))
+        self.upload(content)
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertFalse(image.getexif())
+        self.assertLess(post.image.size, len(content))
+
+    def test_small_clean_image_kept_as_is(self):
+        form = PostForm(
+            data={'text': 'Пост'},
+            files={'image': SimpleUploadedFile('small.gif', SMALL_GIF)},
+        )
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.image_bytes_saved, 0)
+        self.assertEqual(form.cleaned_data['image'].read(), SMALL_GIF)
+
+    @override_settings(UPLOAD_IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_rejected(self):
+        response = self.upload(make_jpeg((20, 20)))
+        self.assertFormError(
+            response, 'form', 'image', 'Изображение слишком большое.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_truncated_image_rejected(self):
+        content = make_jpeg((400, 200))
+        response = self.upload(content[:len(content) // 2])
+        self.assertFormError(
+            response, 'form', 'image', 'Файл изображения повреждён.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class PostImageStorageTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=USERNAME)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=SMALL_GIF):
+        self.client.post(URL_POST_CREATE, data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('small.gif', content),
+        })
+        return Post.objects.latest('pk')
+
+    def test_duplicate_uploads_share_file(self):
+        first = self.create_post()
+        second = self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1
+        )
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).references, 2
+        )
+
+    def test_file_deleted_with_last_reference(self):
+        first = self.create_post()
+        second = self.create_post()
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.client.post(
+            reverse('posts:post_edit', args=[second.pk]),
+            data={
+                'text': 'Новая картинка',
+                'image': SimpleUploadedFile('other.jpg', make_jpeg((4, 4))),
+            },
+        )
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredFile.objects.filter(
+            name=SMALL_GIF_NAME
+        ).exists())
+
+    def test_reuse_claims_file_before_pending_delete(self):
+        first = self.create_post()
+        self.addCleanup(media.forget_claims)
+        # Последняя ссылка снята, а удаление файла ещё не выполнено.
+        StoredFile.objects.filter(name=first.image.name).update(references=0)
+        name = post_image_storage.save(
+            settings.UPLOAD_TO + 'small.gif',
+            SimpleUploadedFile('small.gif', SMALL_GIF),
+        )
+        self.assertEqual(name, first.image.name)
+        media._delete_unreferenced(name)
+        self.assertTrue(os.path.exists(first.image.path))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+    def test_shard_post_images_moves_legacy_files(self):
+        legacy_names = (
+            f'{settings.UPLOAD_TO}old.gif', f'{settings.UPLOAD_TO}copy.gif'
+        )
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, settings.UPLOAD_TO))
+        for name in legacy_names:
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), 'wb') as file:
+                file.write(SMALL_GIF)
+            Post.objects.create(text='Старый пост', author=self.user,
+                                image=name)
+        call_command('shard_post_images', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)),
+            {SMALL_GIF_NAME}
+        )
+        self.assertEqual(
+            StoredFile.objects.get(name=SMALL_GIF_NAME).references, 2
+        )
+        self.assertFalse(
+            StoredFile.objects.filter(name__in=legacy_names).exists()
+        )
+        for name in legacy_names:
+            self.assertFalse(
+                os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+            )
+        self.assertTrue(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, SMALL_GIF_NAME))
+        )
@@ -0,0 +1,37 @@
+from django.template.loader import render_to_string
+from django.test import RequestFactory, SimpleTestCase
+
+from ..paginators import ELLIPSIS, page_window
+from ..views import page_object
+from yatube.settings import POSTS_PER_PAGE
+
+PAGINATOR_TEMPLATE = 'posts/includes/paginator.html'
+
+
+class PageWindowTest(SimpleTestCase):
+    def render(self, total, page):
+        request = RequestFactory().get('/', {'page': page})
+        page_obj = page_object(request, range(total))
+        return render_to_string(PAGINATOR_TEMPLATE, {'page_obj': page_obj})
+
+    def test_window_bounds(self):
+        cases = (
+            (1, [1, 2, 3, ELLIPSIS, 50]),
+            (25, [1, ELLIPSIS, 23, 24, 25, 26, 27, ELLIPSIS, 50]),
+            (50, [1, ELLIPSIS, 48, 49, 50]),
+        )
+        for number, window in cases:
+            with self.subTest(number=number):
+                request = RequestFactory().get('/', {'page': number})
+                page = page_object(request, range(POSTS_PER_PAGE * 50))
+                self.assertEqual(page_window(page), window)
+
+    def test_paginator_html_bounded_by_page_count(self):
+        """Число ссылок в пагинаторе не растёт с числом постов."""
+        small_links = self.render(POSTS_PER_PAGE * 100, 50).count('<a ')
+        for total in (10 ** 4, 10 ** 6, 5 * 10 ** 7):
+            with self.subTest(total=total):
+                middle = total // POSTS_PER_PAGE // 2
+                self.assertEqual(
+                    self.render(total, middle).count('<a '), small_links
+                )
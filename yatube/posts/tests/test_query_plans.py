@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+SLUG = 'test-slug'
+USERNAME = 'auth'
+AUTHOR = 'author'
+# Таблицы, которые выводятся целиком, например группы в списке формы.
+LISTED_TABLES = ('posts_group',)
+
+
+class QueryPlanTest(TestCase):
+    """Запросы каждого представления posts читают таблицы по индексам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug=SLUG, description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def plans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            getattr(self.client, method)(url, data)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans.append(
+                    (sql, [row[-1] for row in cursor.fetchall()])
+                )
+        return plans
+
+    def assert_uses_indexes(self, method, url, data=None, sorts=False):
+        for sql, plan in self.plans(method, url, data):
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    if step.startswith('SCAN'):
+                        self.assertTrue(
+                            'USING' in step
+                            or 'VIRTUAL TABLE' in step
+                            or step.split()[1] in LISTED_TABLES
+                        )
+                    if not sorts:
+                        self.assertNotIn('TEMP B-TREE', step)
+
+    def test_read_views(self):
+        post_id = self.post.pk
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_post', args=[SLUG]),
+            reverse('posts:profile', args=[AUTHOR]),
+            reverse('posts:post_detail', args=[post_id]),
+            reverse('posts:post_comments', args=[post_id]),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', args=[post_id]),
+        )
+        for url in urls:
+            self.assert_uses_indexes('get', url)
+
+    def test_search_uses_full_text_index(self):
+        # Результаты сортируются по рангу bm25, он считается на лету.
+        self.assert_uses_indexes(
+            'get', reverse('posts:search'), {'q': 'пост'}, sorts=True
+        )
+
+    def test_write_views(self):
+        self.assert_uses_indexes(
+            'post', reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ещё комментарий'},
+        )
+        self.assert_uses_indexes(
+            'post', reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assert_uses_indexes(
+            'get', reverse('posts:profile_unfollow', args=[AUTHOR])
+        )
+        self.assert_uses_indexes(
+            'get', reverse('posts:profile_follow', args=[AUTHOR])
+        )
@@ -21,8 +21,12 @@ class RoutesTest(TestCase):
         cases = (
             ('main_page', [], '/'),
             ('post_create', [], '/create/'),
+            ('search', [], '/search/'),
+            ('atom_index', [], '/atom/'),
             ('group_post', [SLUG], f'/group/{SLUG}/'),
+            ('atom_group', [SLUG], f'/group/{SLUG}/atom/'),
             ('profile', [USERNAME], f'/profile/{USERNAME}/'),
+            ('atom_profile', [USERNAME], f'/profile/{USERNAME}/atom/'),
             (
                 'post_detail', [RoutesTest.post.pk],
                 f'/posts/{RoutesTest.post.pk}/'
@@ -32,13 +36,19 @@ class RoutesTest(TestCase):
                 f'/posts/{RoutesTest.post.pk}/edit/'
             ),
             ('follow_index', [], '/follow/'),
+            ('follow_bulk', [], '/follow/bulk/'),
             ('profile_follow', [USERNAME], f'/profile/{USERNAME}/follow/'),
             ('profile_unfollow', [USERNAME], f'/profile/{USERNAME}/unfollow/'),
             (
                 'add_comment',
                 [RoutesTest.post.pk],
                 f'/posts/{RoutesTest.post.pk}/comment/'
-            )
+            ),
+            (
+                'post_comments',
+                [RoutesTest.post.pk],
+                f'/posts/{RoutesTest.post.pk}/comments/'
+            ),
         )
         for url_route, args, url in cases:
             with self.subTest(url=url):
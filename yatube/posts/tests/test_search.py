@@ -0,0 +1,144 @@
+import os
+import random
+import time
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Group, Post, User
+from ..paginators import NEWER, encode_cursor
+from ..search import SearchPaginator, search_posts
+
+SEARCH_URL = reverse('posts:search')
+# Замер скорости запускается только по запросу, с заданным корпусом:
+# SEARCH_BENCHMARK_POSTS=1000000 python manage.py test posts.tests.test_search
+BENCHMARK_POSTS = int(os.environ.get('SEARCH_BENCHMARK_POSTS', 0))
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Коты', slug='cats', description='Про котов'
+        )
+        cls.cat_post = Post.objects.create(
+            text='Кот спит. Кот ест. Кот снова спит.',
+            author=cls.user,
+            group=cls.group,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собака <b>лает</b>, а кот молчит',
+            author=cls.other,
+        )
+
+    def search(self, **params):
+        return self.client.get(SEARCH_URL, params).context['page_obj']
+
+    def test_results_ranked_and_highlighted(self):
+        page = self.search(q='кот')
+        self.assertEqual(list(page), [self.cat_post, self.dog_post])
+        self.assertIn('<mark>Кот</mark> спит', page[0].snippet)
+        self.assertIn('&lt;b&gt;лает&lt;/b&gt;', page[1].snippet)
+
+    def test_prefix_and_all_words_required(self):
+        self.assertEqual(list(self.search(q='соба мол')), [self.dog_post])
+        self.assertEqual(list(self.search(q='собака спит')), [])
+        self.assertIsNone(self.client.get(SEARCH_URL).context['page_obj'])
+
+    def test_query_without_words(self):
+        for query in ('!!!', '-'):
+            with self.subTest(query=query):
+                self.assertEqual(list(self.search(q=query)), [])
+
+    def test_filters(self):
+        self.assertEqual(
+            list(self.search(q='кот', group='cats')), [self.cat_post]
+        )
+        self.assertEqual(
+            list(self.search(q='кот', author='other')), [self.dog_post]
+        )
+        response = self.client.get(SEARCH_URL, {'q': 'кот', 'author': 'x'})
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_index_follows_edit_and_delete(self):
+        cat_post = Post.objects.get(pk=self.cat_post.pk)
+        cat_post.text = 'Теперь про попугая'
+        cat_post.save()
+        self.assertEqual(list(self.search(q='попуга')), [cat_post])
+        self.assertEqual(list(self.search(q='спит')), [])
+        Post.objects.filter(pk=self.dog_post.pk).delete()
+        self.assertEqual(list(self.search(q='собака')), [])
+
+    def test_keyset_pagination(self):
+        Post.objects.bulk_create(
+            Post(text=f'Попугай номер {i}', author=self.user)
+            for i in range(25)
+        )
+        paginator = SearchPaginator(search_posts('попугай'), 10)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual((len(first), len(second), len(third)), (10, 10, 5))
+        self.assertFalse(third.has_next())
+        seen = {post.pk for page in (first, second, third) for post in page}
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(
+            list(paginator.get_page(second.previous_cursor)), list(first)
+        )
+        back = paginator.get_page(encode_cursor(NEWER, -1e9, 0))
+        self.assertEqual(len(back), 0)
+        self.assertFalse(back.has_next())
+
+
+@skipUnless(BENCHMARK_POSTS, 'задайте SEARCH_BENCHMARK_POSTS')
+class SearchBenchmarkTest(TestCase):
+    """Поиск по индексу против LIKE-сканирования на большом корпусе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='auth')
+        words = [f'слово{i}' for i in range(5000)]
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        rng = random.Random(0)
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            for start in range(0, BENCHMARK_POSTS, 10000):
+                rows = []
+                for i in range(start, min(start + 10000, BENCHMARK_POSTS)):
+                    text = ' '.join(rng.choices(words, weights, k=30))
+                    if i % (BENCHMARK_POSTS // 10) == 0:
+                        text += ' редкость'
+                    rows.append((text, now, author.pk, ''))
+                cursor.executemany(
+                    'INSERT INTO posts_post (text, pub_date, author_id, image)'
+                    ' VALUES (%s, %s, %s, %s)',
+                    rows,
+                )
+
+    def measure(self, fetch):
+        started = time.perf_counter()
+        result = fetch()
+        return result, time.perf_counter() - started
+
+    def test_search_against_like(self):
+        found, search_time = self.measure(lambda: list(
+            SearchPaginator(search_posts('редкость'), 10).get_page(None)
+        ))
+        scanned, like_time = self.measure(lambda: list(
+            Post.objects.filter(text__icontains='редкость')[:10]
+        ))
+        self.assertEqual({post.pk for post in found},
+                         {post.pk for post in scanned})
+        _, common_time = self.measure(lambda: list(
+            SearchPaginator(search_posts('слово0'), 10).get_page(None)
+        ))
+        print(
+            f'\n{BENCHMARK_POSTS} постов: '
+            f'редкое слово {search_time:.4f} с, '
+            f'LIKE {like_time:.4f} с, частое слово {common_time:.4f} с'
+        )
@@ -1,13 +1,28 @@
 import shutil
 import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
 
-from django.test import Client, TestCase, override_settings
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Comment, Follow, Group, Post, User
+from ..caching import bump_feed_generation, feed_generation
+from ..cards import card_key
+from ..stats import for_user as stats_for
+from ..thumbnails import generate_thumbnails
+from ..paginators import NEWER, CursorPaginator, encode_cursor
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats
+)
 from yatube.settings import POSTS_PER_PAGE
 
 
@@ -197,6 +212,46 @@ class PostsViewsTests(TestCase):
         )
         self.assertNotIn(PostsViewsTests.post, foreign_page_obj)
 
+    def test_new_post_pushed_to_follower_timeline(self):
+        post = Post.objects.create(
+            text='Пост для ленты', author=PostsViewsTests.user
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=PostsViewsTests.user2, post=post
+        ).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=PostsViewsTests.user3, post=post
+        ).exists())
+
+    def test_rebuild_timelines_command(self):
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        response = PostsViewsTests.authorized_client2.get(FOLLOW_PAGE_URL)
+        self.assertIn(PostsViewsTests.post, response.context['page_obj'])
+
+    def test_profile_counters(self):
+        stats = PostsViewsTests.authorized_client.get(
+            PROFILE_URL
+        ).context['stats']
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.following_count, 0)
+        self.assertEqual(stats.followers_count, 1)
+        PostsViewsTests.authorized_client.get(PROFILE_FOLLOW)
+        Post.objects.create(text='Ещё пост', author=PostsViewsTests.user)
+        PostsViewsTests.authorized_client2.get(PROFILE_UNFOLLOW)
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.following_count, 1)
+        self.assertEqual(stats.followers_count, 0)
+
+    def test_check_user_stats_command_fixes_drift(self):
+        UserStats.objects.create(user=PostsViewsTests.user, posts_count=7)
+        Post.objects.create(text='Второй пост', author=PostsViewsTests.user)
+        call_command('check_user_stats', chunk_size=1, stdout=StringIO())
+        stats = UserStats.objects.get(user=PostsViewsTests.user)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -242,3 +297,646 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(name=name):
                 response = PaginatorViewsTest.client.get(name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 1)
+
+
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+        )
+        for i in range(POSTS_PER_PAGE * 2 + 1):
+            Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=cls.user,
+                group=cls.group
+            )
+        cls.client = Client()
+        cls.client.force_login(user=CursorPaginatorViewsTest.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_walk_whole_feed(self):
+        for url in (MAIN_PAGE_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                seen = []
+                page = CursorPaginatorViewsTest.client.get(url).context[
+                    'page_obj'
+                ]
+                self.assertFalse(page.has_previous())
+                seen.extend(page)
+                while page.has_next():
+                    page = CursorPaginatorViewsTest.client.get(
+                        url, {'cursor': page.next_cursor}
+                    ).context['page_obj']
+                    seen.extend(page)
+                self.assertEqual(len(page), 1)
+                self.assertEqual(seen, list(Post.objects.order_by(
+                    '-pub_date', '-pk'
+                )))
+
+    def test_previous_cursor_returns_newer_page(self):
+        first = CursorPaginatorViewsTest.client.get(
+            MAIN_PAGE_URL
+        ).context['page_obj']
+        second = CursorPaginatorViewsTest.client.get(
+            MAIN_PAGE_URL, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        back = CursorPaginatorViewsTest.client.get(
+            MAIN_PAGE_URL, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_follow_feed_walks_in_timeline_order(self):
+        reader = User.objects.create_user(username=USERNAME2)
+        Follow.objects.create(
+            user=reader, author=CursorPaginatorViewsTest.user
+        )
+        call_command('rebuild_timelines', stdout=StringIO())
+        # Записи ленты идут в обратном порядке относительно постов.
+        entries = list(TimelineEntry.objects.filter(
+            user=reader
+        ).order_by('pub_date', 'pk'))
+        dates = [entry.pub_date for entry in entries]
+        for entry, pub_date in zip(entries, reversed(dates)):
+            TimelineEntry.objects.filter(pk=entry.pk).update(
+                pub_date=pub_date
+            )
+        client = Client()
+        client.force_login(reader)
+        page = client.get(FOLLOW_PAGE_URL).context['page_obj']
+        seen = list(page)
+        while page.has_next():
+            page = client.get(
+                FOLLOW_PAGE_URL, {'cursor': page.next_cursor}
+            ).context['page_obj']
+            seen.extend(page)
+        self.assertEqual(seen, [entry.post for entry in entries])
+
+    def test_empty_newer_page(self):
+        future = encode_cursor(
+            NEWER, datetime(2999, 1, 1, tzinfo=timezone.utc), 1
+        )
+        post = Post.objects.first()
+        for url in (
+            MAIN_PAGE_URL,
+            reverse('posts:post_detail', args=[post.pk]),
+            reverse('posts:post_comments', args=[post.pk]),
+        ):
+            with self.subTest(url=url):
+                response = CursorPaginatorViewsTest.client.get(
+                    url, {'cursor': future}
+                )
+                self.assertEqual(response.status_code, 200)
+        page = CursorPaginator(Post.objects.all(), POSTS_PER_PAGE).get_page(
+            future
+        )
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_next())
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_newer_page_has_next_only_if_older_rows_exist(self):
+        oldest = Post.objects.order_by('pub_date', 'pk').first()
+        page = CursorPaginator(Post.objects.all(), POSTS_PER_PAGE).get_page(
+            encode_cursor(NEWER, oldest.pub_date, oldest.pk)
+        )
+        self.assertEqual(len(page), POSTS_PER_PAGE)
+        self.assertTrue(page.has_next())
+        page = CursorPaginator(Post.objects.all(), POSTS_PER_PAGE).get_page(
+            encode_cursor(NEWER, oldest.pub_date, oldest.pk - 1)
+        )
+        self.assertFalse(page.has_next())
+
+    def test_page_number_fallback_and_bad_cursor(self):
+        response = CursorPaginatorViewsTest.client.get(
+            MAIN_PAGE_URL + '?page=3'
+        )
+        self.assertEqual(response.context['page_obj'].number, 3)
+        self.assertEqual(len(response.context['page_obj']), 1)
+        cache.clear()
+        response = CursorPaginatorViewsTest.client.get(
+            MAIN_PAGE_URL, {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(len(response.context['page_obj']), POSTS_PER_PAGE)
+
+
+class QueryBudgetViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=USERNAME2)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.client = Client()
+        cls.client.force_login(user=QueryBudgetViewsTest.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=QueryBudgetViewsTest.user,
+                group=QueryBudgetViewsTest.group,
+            )
+
+    def count_queries(self, url):
+        QueryBudgetViewsTest.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                QueryBudgetViewsTest.client.get(url).status_code, 200
+            )
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        urls = (MAIN_PAGE_URL, GROUP_URL, PROFILE_URL, FOLLOW_PAGE_URL)
+        self.create_posts(1)
+        budget = {url: self.count_queries(url) for url in urls}
+        self.create_posts(POSTS_PER_PAGE * 2)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), budget[url])
+
+
+class FeedCacheInvalidationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.post = Post.objects.create(text='Тестовый пост', author=self.user)
+
+    def test_index_cached_until_posts_change(self):
+        response = self.client.get(MAIN_PAGE_URL)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertEqual(
+            response.content, self.client.get(MAIN_PAGE_URL).content
+        )
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.assertIn(
+            'Новый пост', self.client.get(MAIN_PAGE_URL).content.decode()
+        )
+
+    def test_writes_in_transaction_bump_generation_once(self):
+        generation = feed_generation()
+        with transaction.atomic():
+            for i in range(3):
+                Post.objects.create(text=f'Пост {i}', author=self.user)
+            Group.objects.create(title='Группа', slug=SLUG)
+            self.assertEqual(feed_generation(), generation)
+        self.assertEqual(feed_generation(), generation + 1)
+
+    def test_write_after_savepoint_rollback_bumps_generation(self):
+        generation = feed_generation()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Post.objects.create(text='Откатится', author=self.user)
+                    raise ValueError
+            except ValueError:
+                pass
+            Post.objects.create(text='Останется', author=self.user)
+        self.assertEqual(feed_generation(), generation + 1)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(settings.COMMENTS_PER_PAGE + 1)
+        )
+        cls.URL_POST_DETAIL = reverse(
+            'posts:post_detail', args=[cls.post.pk]
+        )
+        cls.URL_COMMENTS = reverse(
+            'posts:post_comments', args=[cls.post.pk]
+        )
+
+    def test_comments_are_paginated(self):
+        comments = self.client.get(
+            CommentsPaginationTest.URL_POST_DETAIL
+        ).context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        response = self.client.get(
+            CommentsPaginationTest.URL_COMMENTS,
+            {'cursor': comments.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 1)
+        self.assertFalse(rest.has_next())
+        self.assertEqual(
+            list(comments) + list(rest),
+            list(Comment.objects.order_by('-created', '-pk'))
+        )
+
+    def test_comment_authors_loaded_in_bulk(self):
+        with self.assertNumQueries(2):
+            self.client.get(CommentsPaginationTest.URL_COMMENTS)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title='Тестовая группа', slug=SLUG)
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_cached_once_per_post(self):
+        self.client.get(PROFILE_URL)
+        key = card_key(PostCardCacheTest.post, hide_group=False)
+        self.assertIn('Тестовый пост', cache.get(key))
+        cache.set(key, 'закэшированная карточка')
+        # Страница профиля закэширована целиком, карточки — отдельно.
+        bump_feed_generation()
+        self.assertContains(
+            self.client.get(PROFILE_URL), 'закэшированная карточка'
+        )
+
+    def test_card_rerendered_after_author_and_group_edit(self):
+        self.client.get(PROFILE_URL)
+        user = User.objects.get(pk=PostCardCacheTest.user.pk)
+        user.first_name = 'Лев'
+        user.last_name = 'Толстой'
+        user.save()
+        group = Group.objects.get(pk=PostCardCacheTest.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        bump_feed_generation()
+        response = self.client.get(PROFILE_URL)
+        self.assertContains(response, 'Лев Толстой')
+        self.assertContains(response, 'Новое название')
+
+
+@override_settings(
+    POSTS_COUNT_FREE_PAGINATION=True, BACKGROUND_TASKS_EAGER=True
+)
+class CountFreePaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+        )
+        for i in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=cls.user,
+                group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_without_count_query(self):
+        for url in (GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                self.client.get(url)
+                bump_feed_generation()
+                with CaptureQueriesContext(connection) as queries:
+                    page = self.client.get(url).context['page_obj']
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries
+                ))
+                self.assertEqual(len(page), POSTS_PER_PAGE)
+                self.assertTrue(page.has_next())
+                self.assertEqual(page.paginator.num_pages, 2)
+                last = self.client.get(url + '?page=2').context['page_obj']
+                self.assertEqual(len(last), 1)
+                self.assertFalse(last.has_next())
+
+    def test_out_of_range_page_falls_back_to_last(self):
+        for url in (GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                cache.clear()
+                page = self.client.get(url + '?page=99').context['page_obj']
+                self.assertEqual(page.number, 2)
+                self.assertEqual(len(page), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class ThumbnailGenerationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    def test_thumbnail_generated_after_save(self):
+        post = self.create_post()
+        response = self.client.get(PROFILE_URL)
+        self.assertNotContains(response, post.image.url)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_original_image_until_thumbnail_exists(self):
+        with transaction.atomic():
+            post = self.create_post()
+            response = self.client.get(PROFILE_URL)
+            self.assertContains(response, post.image.url)
+            self.assertIsNone(cache.get(card_key(
+                response.context['page_obj'][0], hide_group=False
+            )))
+
+    def test_cached_page_switches_to_thumbnail(self):
+        with mock.patch('posts.thumbnails.run_after_commit'):
+            post = self.create_post()
+            response = self.client.get(PROFILE_URL)
+        self.assertContains(response, post.image.url)
+        generate_thumbnails(post.image.name)
+        response = self.client.get(PROFILE_URL)
+        self.assertNotContains(response, post.image.url)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+
+class FollowStatementsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=USERNAME2)
+        cls.author2 = User.objects.create_user(username=USERNAME3)
+        Post.objects.create(text='Пост автора', author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def writes(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        return response, [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        follow_url = reverse('posts:profile_follow', args=[USERNAME2])
+        unfollow_url = reverse('posts:profile_unfollow', args=[USERNAME2])
+        _, writes = self.writes(follow_url)
+        self.assertEqual(len(writes), 2)
+        self.assertIn('posts_follow', writes[0])
+        self.assertIn('posts_timelineentry', writes[1])
+        _, writes = self.writes(follow_url)
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1
+        )
+        self.writes(unfollow_url)
+        _, writes = self.writes(unfollow_url)
+        self.assertEqual(len(writes), 1)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_unknown_author_not_found(self):
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(name=name):
+                response, writes = self.writes(reverse(name, args=['nobody']))
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(writes, [])
+
+    def test_bulk_follow_and_unfollow(self):
+        url = reverse('posts:follow_bulk')
+        usernames = f'{USERNAME2}, {USERNAME3} {USERNAME} nobody {USERNAME2}'
+        response, _ = self.writes(
+            url, {'action': 'follow', 'usernames': usernames}
+        )
+        self.assertEqual(response.json(), {'changed': [USERNAME2, USERNAME3]})
+        self.assertEqual(stats_for(self.user).following_count, 2)
+        response, _ = self.writes(
+            url, {'action': 'follow', 'usernames': usernames}
+        )
+        self.assertEqual(response.json(), {'changed': []})
+        response, _ = self.writes(
+            url, {'action': 'unfollow', 'usernames': USERNAME3}
+        )
+        self.assertEqual(response.json(), {'changed': [USERNAME3]})
+        self.assertEqual(
+            list(Follow.objects.values_list('author__username', flat=True)),
+            [USERNAME2]
+        )
+        self.assertEqual(stats_for(self.user).following_count, 1)
+
+    @override_settings(FOLLOW_BULK_MAX_USERNAMES=1)
+    def test_bulk_follow_rejects_bad_input(self):
+        url = reverse('posts:follow_bulk')
+        for data in (
+            {'action': 'block', 'usernames': USERNAME2},
+            {'action': 'follow', 'usernames': f'{USERNAME2} {USERNAME3}'},
+        ):
+            with self.subTest(data=data):
+                response, writes = self.writes(url, data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(writes, [])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+class ConditionalGetTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username=USERNAME2)
+        self.group = Group.objects.create(title='Группа', slug=SLUG)
+        self.post = Post.objects.create(
+            text='Тестовый пост', author=self.user, group=self.group
+        )
+        self.post_url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def revalidate(self, url, response):
+        with self.assertNumQueries(0):
+            return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_not_modified(self):
+        # id автора профиля берётся из кэша запросов.
+        for url in (MAIN_PAGE_URL, GROUP_URL, PROFILE_URL, self.post_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertEqual(
+                    self.revalidate(url, response).status_code, 304
+                )
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                ).status_code, 304)
+
+    def test_changes_refresh_validators(self):
+        feed = self.client.get(MAIN_PAGE_URL)
+        detail = self.client.get(self.post_url)
+        profile = self.client.get(PROFILE_URL)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertEqual(self.client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=detail['ETag']
+        ).status_code, 200)
+        self.assertEqual(self.revalidate(MAIN_PAGE_URL, feed).status_code,
+                         304)
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.client.get(
+            PROFILE_URL, HTTP_IF_NONE_MATCH=profile['ETag']
+        ).status_code, 200)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(
+            MAIN_PAGE_URL, HTTP_IF_NONE_MATCH=feed['ETag']
+        )
+        self.assertContains(response, 'Новый пост')
+
+    def test_validators_depend_on_user(self):
+        anonymous = self.client.get(MAIN_PAGE_URL)
+        self.client.force_login(self.reader)
+        response = self.client.get(
+            MAIN_PAGE_URL, HTTP_IF_NONE_MATCH=anonymous['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_new_csrf_token_refreshes_form_pages(self):
+        self.client.force_login(self.reader)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        detail = self.client.get(self.post_url)
+        self.assertEqual(self.client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=detail['ETag']
+        ).status_code, 304)
+        # Повторный вход выдаёт новый токен CSRF.
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        self.assertEqual(self.client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=detail['ETag']
+        ).status_code, 200)
+
+
+class AtomFeedTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.group = Group.objects.create(title='Группа', slug=SLUG)
+        self.post = Post.objects.create(
+            text='Пост для ленты', author=self.user, group=self.group
+        )
+        Post.objects.create(text='Пост без группы', author=self.user)
+        self.urls = (
+            reverse('posts:atom_index'),
+            reverse('posts:atom_group', args=[SLUG]),
+            reverse('posts:atom_profile', args=[USERNAME]),
+        )
+
+    def test_feeds_list_posts(self):
+        for url, count in zip(self.urls, (2, 1, 2)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(
+                    response['Content-Type'].startswith('application/atom')
+                )
+                self.assertEqual(response.content.count(b'<entry>'), count)
+                self.assertContains(response, 'Пост для ленты')
+                self.assertIn('public', response['Cache-Control'])
+
+    def test_polls_end_in_not_modified_without_queries(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    ).status_code, 304)
+                    self.assertEqual(self.client.get(
+                        url,
+                        HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                    ).status_code, 304)
+
+    def test_new_post_refreshes_feeds(self):
+        responses = [self.client.get(url) for url in self.urls]
+        Post.objects.create(
+            text='Свежий пост', author=self.user, group=self.group
+        )
+        for url, response in zip(self.urls, responses):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                ), 'Свежий пост')
+
+
+class HolePunchedPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.follower = User.objects.create_user(username='follower')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug=SLUG)
+        Post.objects.create(text='Пост', author=cls.author, group=cls.group)
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_as(self, user, url):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        return client.get(url)
+
+    def test_page_body_shared_between_users(self):
+        for url in (MAIN_PAGE_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                self.get_as(None, url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.get_as(self.reader, url)
+                self.assertFalse(any(
+                    'posts_post' in query['sql'] for query in queries
+                ))
+                self.assertContains(response, 'Пост')
+                self.assertContains(response, 'Пользователь: <a')
+                self.assertNotContains(response, '<!--hole')
+                anonymous = self.get_as(None, url)
+                self.assertNotContains(anonymous, 'Пользователь: <a')
+                self.assertContains(anonymous, 'Регистрация')
+
+    def test_switcher_only_for_authenticated(self):
+        self.get_as(None, MAIN_PAGE_URL)
+        self.assertContains(
+            self.get_as(self.reader, MAIN_PAGE_URL), 'Избранные авторы'
+        )
+        self.assertNotContains(
+            self.get_as(None, MAIN_PAGE_URL), 'Избранные авторы'
+        )
+
+    def test_follow_button_per_user(self):
+        self.get_as(None, PROFILE_URL)
+        self.assertContains(
+            self.get_as(self.follower, PROFILE_URL), 'Отписаться'
+        )
+        self.assertContains(
+            self.get_as(self.reader, PROFILE_URL), 'Подписаться'
+        )
+        response = self.get_as(self.author, PROFILE_URL)
+        self.assertNotContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Отписаться')
@@ -0,0 +1,101 @@
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.tasks import run_after_commit
+
+from .caching import bump_feed_generation
+from .storage import post_image_storage
+
+# Те же размеры и опции, что у {% thumbnail %} в шаблонах постов.
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+SCHEDULE_LOCK_TIMEOUT = 60
+
+_local = threading.local()
+
+
+class PendingTracker:
+    pending = False
+
+
+@contextmanager
+def track_pending():
+    """Отмечает, отдавался ли при рендере оригинал вместо миниатюры."""
+    previous = getattr(_local, 'tracker', None)
+    tracker = _local.tracker = PendingTracker()
+    try:
+        yield tracker
+    finally:
+        _local.tracker = previous
+
+
+def generate_thumbnails(name, thumbnails=POST_THUMBNAILS):
+    """Создаёт миниатюры и сменяет поколение лент.
+
+    Страницы, отрисованные с исходной картинкой, закэшированы по
+    поколению и сверяются по ETag с ним же: без смены поколения
+    оригинал отдавался бы до истечения кэша страниц.
+    """
+    source = ImageFile(name, post_image_storage)
+    for geometry, options in thumbnails:
+        default.backend.generate(source, geometry, **options)
+    bump_feed_generation()
+
+
+def schedule_thumbnails(name, thumbnails=POST_THUMBNAILS):
+    """Ставит генерацию миниатюр в фоновый пул после коммита."""
+    thumbnails = tuple(
+        (geometry, options) for geometry, options in thumbnails
+        if cache.add(
+            f'posts:thumbnail:{name}:{geometry}', 1, SCHEDULE_LOCK_TIMEOUT
+        )
+    )
+    if thumbnails:
+        run_after_commit(generate_thumbnails, name, thumbnails)
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Не создаёт миниатюры во время запроса.
+
+    Готовая миниатюра берётся из KV-хранилища sorl. Если её ещё нет,
+    генерация уходит в фоновый пул, а шаблон получает исходную
+    картинку.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        self._set_default_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        schedule_thumbnails(source.name, ((geometry_string, options),))
+        tracker = getattr(_local, 'tracker', None)
+        if tracker is not None:
+            tracker.pending = True
+        return source
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _set_default_options(self, source, options):
+        # Повторяет подготовку опций из ThumbnailBackend.get_thumbnail,
+        # чтобы имя миниатюры совпало с именем при генерации.
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
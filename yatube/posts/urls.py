@@ -10,8 +10,16 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='main_page'),
     path('create/', views.post_create, name='post_create'),
+    path('search/', views.search, name='search'),
+    path('atom/', views.atom_index, name='atom_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_post'),
+    path('group/<slug:slug>/atom/', views.atom_group, name='atom_group'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/atom/',
+        views.atom_profile,
+        name='atom_profile'
+    ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path(
         "posts/<int:post_id>/edit/",
@@ -22,7 +30,12 @@ urlpatterns = [
         'posts/<int:post_id>/comment/',
         views.add_comment, name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments, name='post_comments'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
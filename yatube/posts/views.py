@@ -1,67 +1,142 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, render, redirect
 
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from . import feeds, follows, stats, syndication
+from .caching import cache_feed
+from .conditional import (
+    conditional, feed_versions, follow_versions, post_versions,
+    profile_versions
+)
+from .cards import attach_cards
+from .forms import BulkFollowForm, CommentForm, PostForm, SearchForm
+from .models import Post, User
+from .paginators import CountFreePaginator, CursorPaginator, page_window
+from .search import SearchPaginator, search_posts
 from yatube.settings import POSTS_PER_PAGE
 
 
-def page_object(request, posts):
-    paginator = Paginator(posts, POSTS_PER_PAGE)
+def page_object(request, posts, field='pub_date'):
+    cursor = request.GET.get('cursor')
+    if cursor or (
+        settings.POSTS_CURSOR_PAGINATION and 'page' not in request.GET
+    ):
+        return CursorPaginator(
+            posts, POSTS_PER_PAGE, field=field
+        ).get_page(cursor)
+    if settings.POSTS_COUNT_FREE_PAGINATION:
+        paginator = CountFreePaginator(posts, POSTS_PER_PAGE)
+    else:
+        paginator = Paginator(posts, POSTS_PER_PAGE)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    page = paginator.get_page(page_number)
+    page.page_window = page_window(page)
+    return page
 
 
-@cache_page(20)
+@conditional(feed_versions)
+@cache_feed(feed_versions)
 def index(request):
-    post_list = Post.objects.all()
     context = {
-        'page_obj': page_object(request, post_list),
+        'page_obj': attach_cards(page_object(request, feeds.all_posts())),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(feed_versions)
+@cache_feed(feed_versions)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    group = get_object_or_404(feeds.groups(), slug=slug)
     template = 'posts/group_list.html'
     context = {
         'group': group,
-        'page_obj': page_object(request, posts),
+        'page_obj': attach_cards(
+            page_object(request, feeds.group_posts(group)), hide_group=True
+        ),
     }
     return render(request, template, context)
 
 
+@conditional(profile_versions)
+@cache_feed(profile_versions)
 def profile(request, username):
     template = 'posts/profile.html'
-    user = get_object_or_404(User, username=username)
-    following = (
-        request.user.is_authenticated
-        and request.user != user
-        and Follow.objects.filter(user=request.user, author=user).exists()
-    )
+    user = get_object_or_404(feeds.users(), username=username)
     context = {
         'author': user,
-        'page_obj': page_object(request, user.posts.all()),
-        'following': following,
+        'page_obj': attach_cards(
+            page_object(request, feeds.author_posts(user))
+        ),
+        'stats': stats.for_user(user),
     }
     return render(request, template, context)
 
 
+# Ленты меняются только вместе с поколением лент, поэтому опрос
+# читателей в основном заканчивается 304 без обращения к базе.
+atom_index = conditional(feed_versions, per_user=False)(
+    cache_feed(feed_versions)(syndication.LatestPostsFeed())
+)
+atom_group = conditional(feed_versions, per_user=False)(
+    cache_feed(feed_versions)(syndication.GroupPostsFeed())
+)
+atom_profile = conditional(feed_versions, per_user=False)(
+    cache_feed(feed_versions)(syndication.AuthorPostsFeed())
+)
+
+
+def comments_page(request, post):
+    return feeds.comments_page(post, request.GET.get('cursor'))
+
+
+@conditional(post_versions, csrf=True)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(feeds.all_posts(), pk=post_id)
     context = {
         'post': post,
-        'comments': post.comments.all(),
+        'comments': comments_page(request, post),
         'form': CommentForm(request.POST or None),
     }
     return render(request, template, context)
 
 
+@conditional(post_versions)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        posts = search_posts(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+        )
+        page_obj = SearchPaginator(posts, POSTS_PER_PAGE).get_page(
+            request.GET.get('cursor')
+        )
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query': query.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -115,28 +190,41 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional(follow_versions)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': page_object(request, posts)}
+    posts = feeds.followed_posts(request.user)
+    context = {'page_obj': attach_cards(
+        page_object(request, posts, field=feeds.FOLLOWED_FIELD)
+    )}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user != author and not request.user.follower.filter(
-        author=author
-    ).exists():
-        Follow.objects.create(
-            user=request.user,
-            author=author
-        )
+    get_object_or_404(feeds.users(), username=username)
+    follows.follow(request.user, [username])
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(
-        Follow.objects.filter(user=request.user, author__username=username)
-    ).delete()
+    get_object_or_404(feeds.users(), username=username)
+    follows.unfollow(request.user, [username])
     return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    form = BulkFollowForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    apply = (
+        follows.follow if form.cleaned_data['action'] == 'follow'
+        else follows.unfollow
+    )
+    author_ids = apply(request.user, form.cleaned_data['usernames'])
+    changed = User.objects.filter(pk__in=author_ids).values_list(
+        'username', flat=True
+    )
+    return JsonResponse({'changed': sorted(changed)})
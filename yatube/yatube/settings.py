@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -132,6 +133,12 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 UPLOAD_TO = 'posts/'
+# Загруженные картинки уменьшаются до UPLOAD_IMAGE_MAX_SIDE по большей
+# стороне и перекодируются (JPEG/PNG или WEBP) без EXIF.
+UPLOAD_IMAGE_MAX_SIDE = 2560
+UPLOAD_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+UPLOAD_IMAGE_FORMAT = 'JPEG'
+UPLOAD_IMAGE_QUALITY = 85
 
 STATIC_URL = '/static/'
 
@@ -170,11 +177,71 @@ if DEBUG:
     DEFAULT_FROM_EMAIL = 'testing@example.com'
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# Курсорная пагинация лент; ссылки ?page=N продолжают работать.
+POSTS_CURSOR_PAGINATION = False
+# Пагинация без COUNT(*): число страниц берётся из кэша и
+# пересчитывается в фоне раз в FEED_COUNT_TIMEOUT секунд.
+POSTS_COUNT_FREE_PAGINATION = False
+FEED_COUNT_TIMEOUT = 60 * 5
+# Сколько записей отдают Atom-ленты.
+SYNDICATION_ITEMS = 20
+# Сколько имён принимает массовая подписка за один запрос.
+FOLLOW_BULK_MAX_USERNAMES = 100
+
+# Страницы лент сбрасываются сигналами при изменении постов и групп.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Карточки постов: ключ меняется при правке поста, автора или группы.
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Защита от одновременного пересчёта (core.singleflight). Устаревшая
+# запись отдаётся ещё CACHE_STALE_TIMEOUT секунд, пока её пересчитывает
+# один запрос; сроки жизни укорачиваются случайно на CACHE_TTL_JITTER.
+CACHE_STALE_TIMEOUT = 60 * 10
+CACHE_TTL_JITTER = 0.1
+CACHE_LOCK_TIMEOUT = 30
+# Сколько секунд ждать чужой пересчёт, если записи нет совсем.
+CACHE_LOCK_WAIT = 2
+
+# Кэш результатов запросов (core.querycache.cached). Кэшируются только
+# запросы к этим таблицам; запись в любую из них сбрасывает результаты
+# после коммита.
+QUERY_CACHE_TABLES = (
+    'posts_post', 'posts_group', 'posts_follow', 'posts_comment',
+    'auth_user',
+)
+QUERY_CACHE_TIMEOUT = 60 * 5
+
+# Пул потоков для фоновых задач (core.tasks).
+BACKGROUND_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False
+
+# Миниатюры создаются в фоне после сохранения поста, а не при рендере.
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Кэш в файле SQLite общий для всех воркеров на машине: страницы,
+# поколение лент и счётчики одни на все процессы. Перед ним в каждом
+# процессе небольшой LRU: горячие ключи читаются из памяти и отстают
+# от общего кэша не больше чем на LOCAL_TIMEOUT секунд.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': 5,
+            'LOCAL_MAX_BYTES': 8 * 1024 * 1024,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
+    },
 }
+
+# Тесты получают свой кэш во временном каталоге.
+TEST_RUNNER = 'core.test_runner.IsolatedCacheRunner'